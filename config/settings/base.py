@@ -247,6 +247,20 @@ JWT_SECRET = env.str("DJANGO_JWT_SECRET", "")
 
 WHITENOISE_INDEX_FILE = True
 
+# Compression of /api responses (whitenoise only compresses static files).
+# Maps each content type to the content codings it may be sent with,
+# in order of preference.
+API_COMPRESSION_CONTENT_TYPES = {
+    "application/json": ("br", "gzip"),
+    "application/problem+json": ("br", "gzip"),
+    "application/vnd.track+json": ("br", "gzip"),
+    "application/vnd.track+binary": ("gzip",),
+    "application/octet-stream": ("br", "gzip"),
+    "text/plain": ("br", "gzip"),
+}
+# Responses smaller than this (in bytes) are not worth compressing
+API_COMPRESSION_MIN_SIZE = env.int("DJANGO_API_COMPRESSION_MIN_SIZE", 1024)
+
 
 def immutable_file_test(path, url):
     # Match filename with 8 hex digits before the extension
@@ -8,6 +8,10 @@ from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from flask.json import JSONEncoder
 from datetime import datetime
+from uuid import UUID
+
+from compression import CompressionMiddleware
+from home.serializers import encode_datetime
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "my_project.settings.dev")
 apps.populate(settings.INSTALLED_APPS)
@@ -30,9 +34,11 @@ def not_implemented_error(exception):
 
 class CustomJSONEncoder(JSONEncoder):
     def default(self, obj):
+        if isinstance(obj, datetime):
+            return encode_datetime(obj)
+        if isinstance(obj, UUID):
+            return str(obj)
         try:
-            if isinstance(obj, datetime):
-                return obj.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
             iterable = iter(obj)
         except TypeError:
             pass
@@ -45,6 +51,11 @@ def create_app():
     app = connexion.FlaskApp(__name__, specification_dir="openapi/", arguments={})
     flask_app = app.app
     flask_app.json_encoder = CustomJSONEncoder
+    flask_app.wsgi_app = CompressionMiddleware(
+        flask_app.wsgi_app,
+        content_types=settings.API_COMPRESSION_CONTENT_TYPES,
+        min_size=settings.API_COMPRESSION_MIN_SIZE,
+    )
     app.add_api("openapi.yaml", strict_validation=True)
     app.add_error_handler(ObjectDoesNotExist, object_does_not_exist)
     app.add_error_handler(ValidationError, validation_error)
@@ -0,0 +1,176 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli comes in with the whitenoise[brotli] extra
+    brotli = None
+
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class GzipCompressor(object):
+    def __init__(self, level=6):
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+    def compress(self, data):
+        return self._compressobj.compress(data)
+
+    def flush(self):
+        return self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressobj.flush()
+
+
+class BrotliCompressor(object):
+    def __init__(self, quality=5):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+
+
+def parse_accept_encoding(header):
+    """returns a dict of the content codings in an Accept-Encoding header
+    and their quality. codings with q=0 are kept, as they exclude a coding
+    that `*` would otherwise allow.
+    """
+    accepted = {}
+    for coding in header.split(","):
+        name, _, params = coding.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+    return accepted
+
+
+def is_acceptable(accepted, coding):
+    """if a parsed Accept-Encoding allows a coding (RFC 7231 section 5.3.4).
+    codings that aren't listed are allowed by `*`, and identity is allowed
+    unless it (or `*`) is excluded with q=0.
+    """
+    if coding in accepted:
+        return accepted[coding] > 0.0
+    if "*" in accepted:
+        return accepted["*"] > 0.0
+    return coding == "identity"
+
+
+class CompressionMiddleware(object):
+    """
+    WSGI middleware that compresses responses using the best content coding
+    that both the client (Accept-Encoding) and the response content type
+    (see `content_types`) allow.
+
+    The body is compressed chunk by chunk as the app produces it, and each
+    chunk is flushed, so a streamed response reaches the client as it is
+    produced rather than after it has been collected.
+
+    content_types maps a content type to the codings allowed for it, in
+    order of preference.
+    Responses with a known Content-Length below min_size are left alone.
+    """
+
+    def __init__(self, app, content_types, min_size=1024):
+        self.app = app
+        self.content_types = content_types
+        self.min_size = min_size
+
+    def _choose_coding(self, environ, status, headers):
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            return None
+        if status[:3] in ("204", "304"):
+            return None
+
+        headers = {k.lower(): v for k, v in headers}
+        if "content-encoding" in headers:
+            return None
+        accepted = parse_accept_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        # small responses are sent as they are, unless identity is excluded
+        content_length = headers.get("content-length")
+        if (
+            content_length is not None
+            and int(content_length) < self.min_size
+            and is_acceptable(accepted, "identity")
+        ):
+            return None
+
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        for coding in self.content_types.get(content_type, ()):
+            if coding in COMPRESSORS and is_acceptable(accepted, coding):
+                return coding
+        return None
+
+    def _add_vary(self, headers):
+        for i, (key, value) in enumerate(headers):
+            if key.lower() == "vary":
+                if "accept-encoding" not in value.lower():
+                    headers[i] = (key, value + ", Accept-Encoding")
+                return headers
+        return headers + [("Vary", "Accept-Encoding")]
+
+    def __call__(self, environ, start_response):
+        state = {"compressor": None}
+
+        def _start_response(status, headers, exc_info=None):
+            content_type = ""
+            for key, value in headers:
+                if key.lower() == "content-type":
+                    content_type = value.split(";")[0].strip()
+            if content_type in self.content_types:
+                headers = self._add_vary(list(headers))
+
+            coding = self._choose_coding(environ, status, headers)
+            if coding is None:
+                state["compressor"] = None
+                return start_response(status, headers, exc_info)
+
+            compressor = COMPRESSORS[coding]()
+            state["compressor"] = compressor
+            headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+            headers.append(("Content-Encoding", coding))
+            write = start_response(status, headers, exc_info)
+
+            def _write(data):
+                if data:
+                    write(compressor.compress(data) + compressor.flush())
+
+            return _write
+
+        app_iter = self.app(environ, _start_response)
+        return self._iter_compressed(app_iter, state)
+
+    @staticmethod
+    def _iter_compressed(app_iter, state):
+        try:
+            for chunk in app_iter:
+                compressor = state["compressor"]
+                if compressor is None:
+                    yield chunk
+                elif chunk:
+                    yield compressor.compress(chunk) + compressor.flush()
+            if state["compressor"] is not None:
+                yield state["compressor"].finish()
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
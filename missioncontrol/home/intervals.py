@@ -0,0 +1,235 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from heapq import heappush, heappop
+from itertools import count
+
+from django.db.models import Q
+from numpy import asarray, maximum, searchsorted, zeros
+from psycopg2.extras import DateTimeTZRange
+
+from home.models import Pass, PASS_NOT_STALE, GS_RESET_TIME_S
+
+
+class IntervalIndex:
+    """an index of (start, end) intervals, for finding the gaps between them
+    and what overlaps them, ends included.
+    intervals that overlap are merged, so the index is two sorted lists.
+    """
+
+    def __init__(self, intervals):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals, key=lambda interval: interval[0]):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def add(self, start, end):
+        """adds an interval, merging it with those it overlaps"""
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def overlaps(self, start, end):
+        i = bisect_right(self.starts, end) - 1
+        return i >= 0 and self.ends[i] >= start
+
+    def overlaps_mask(self, starts, ends):
+        """the array version of `overlaps`, for numbers"""
+        starts, ends = asarray(starts), asarray(ends)
+        if not self.starts:
+            return zeros(ends.shape, dtype=bool)
+        i = searchsorted(self.starts, ends, side="right") - 1
+        return (i >= 0) & (asarray(self.ends)[maximum(i, 0)] >= starts)
+
+    def gaps(self, start, end):
+        """yields the (start, end) gaps between the intervals, from start to
+        end. the ends of a gap touch the intervals next to it.
+        """
+        i = bisect_left(self.ends, start)
+        for interval_start, interval_end in zip(self.starts[i:], self.ends[i:]):
+            if interval_start > end:
+                break
+            if interval_start > start:
+                yield start, interval_start
+            start = interval_end
+        if start < end:
+            yield start, end
+
+
+def overlapping_pairs(intervals):
+    """yields each pair of (start, end, item) intervals that overlap, ends
+    included.
+    the intervals are sorted by start and swept once, keeping a heap of the
+    ones that haven't ended yet.
+    """
+    intervals = sorted(intervals, key=lambda interval: interval[0])
+    active = []
+    tie_breaker = count()
+    for start, end, item in intervals:
+        while active and active[0][0] < start:
+            heappop(active)
+        for _, _, other in active:
+            yield other, item
+        heappush(active, (end, next(tie_breaker), item))
+
+
+def overlapping_groups(intervals):
+    """yields the groups of (start, end, item) intervals that overlap, ends
+    included. each interval in a group overlaps another one in it, and the
+    groups are lists ordered by start. intervals that don't overlap any
+    other are left out.
+    """
+    group = []
+    group_end = None
+    for interval in sorted(intervals, key=lambda interval: interval[0]):
+        if group and interval[0] > group_end:
+            if len(group) > 1:
+                yield group
+            group = []
+        if not group or interval[1] > group_end:
+            group_end = interval[1]
+        group.append(interval)
+    if len(group) > 1:
+        yield group
+
+
+def pass_conflicts(passes):
+    """finds the passes that conflict, those that aren't stale and are within
+    GS_RESET_TIME_S of each other on the same satellite or groundstation.
+    passes need their time_range set, returns a dict of uuid: set of the
+    uuids it conflicts with.
+    """
+    by_asset = defaultdict(list)
+    for _pass in passes:
+        if _pass.is_stale:
+            continue
+        interval = (_pass.time_range.lower, _pass.time_range.upper, _pass.uuid)
+        by_asset["satellite", _pass.satellite_id].append(interval)
+        by_asset["groundstation", _pass.groundstation_id].append(interval)
+
+    conflicts = defaultdict(set)
+    for intervals in by_asset.values():
+        for a, b in overlapping_pairs(intervals):
+            conflicts[a].add(b)
+            conflicts[b].add(a)
+    return conflicts
+
+
+def non_stale_passes(range_start, range_end, satellites=None, groundstations=None):
+    """the passes that aren't stale, with a time_range overlapping the range,
+    on the given satellites or groundstations (hwids, default is all).
+    this is served by the gist index of the pass exclusion constraints.
+    """
+    passes = Pass.objects.filter(
+        PASS_NOT_STALE,
+        time_range__overlap=DateTimeTZRange(range_start, range_end, "[]"),
+    )
+    if satellites is not None or groundstations is not None:
+        passes = passes.filter(
+            Q(satellite__in=satellites or [])
+            | Q(groundstation__in=groundstations or [])
+        )
+    return passes
+
+
+def busy_intervals(range_start, range_end, satellites=None, groundstations=None):
+    """the (lower, upper) time_range of the passes that aren't stale, on each
+    satellite and groundstation (optionally only the given hwids), in a dict
+    of (asset_type, hwid): list of intervals.
+    """
+    passes = non_stale_passes(range_start, range_end, satellites, groundstations)
+    wanted = {"satellite": satellites, "groundstation": groundstations}
+    filtered = satellites is not None or groundstations is not None
+
+    busy = defaultdict(list)
+    for sat, gs, time_range in passes.values_list(
+        "satellite_id", "groundstation_id", "time_range"
+    ):
+        interval = (time_range.lower, time_range.upper)
+        for key in [("satellite", sat), ("groundstation", gs)]:
+            if not filtered or key[1] in (wanted[key[0]] or []):
+                busy[key].append(interval)
+    return busy
+
+
+def find_free_windows(range_start, range_end, groundstations):
+    """finds the windows in a time range where a pass could be put on each
+    groundstation (hwids) without conflicting, the gaps between the passes
+    that aren't stale, less GS_RESET_TIME_S.
+    returns a list of dicts, ordered by groundstation and start_time.
+    """
+    reset = timedelta(seconds=GS_RESET_TIME_S)
+    # a pass's time_range starts GS_RESET_TIME_S before it does
+    busy = busy_intervals(range_start - reset, range_end, groundstations=groundstations)
+
+    windows = []
+    for hwid in groundstations:
+        index = IntervalIndex(busy["groundstation", hwid])
+        for start, end in index.gaps(range_start - reset, range_end):
+            if start + reset < end:
+                windows.append(
+                    {
+                        "groundstation": hwid,
+                        "start_time": start + reset,
+                        "end_time": end,
+                    }
+                )
+    return windows
+
+
+def conflict_report(range_start, range_end, satellites=None, groundstations=None):
+    """finds every group of passes that conflict in a time range, on each
+    satellite and groundstation (optionally only the given hwids).
+    the conflicts are found from start_time and end_time, padded by
+    GS_RESET_TIME_S, rather than time_range, so passes saved before the
+    exclusion constraints can be checked before they are added (see
+    migration 0022).
+    the passes are loaded in one query, and swept per satellite and
+    groundstation, rather than checked one at a time.
+    returns a list of dicts, ordered by start_time.
+    """
+    reset = timedelta(seconds=GS_RESET_TIME_S)
+    passes = Pass.objects.filter(PASS_NOT_STALE)
+    if range_start is not None:
+        passes = passes.filter(end_time__gte=range_start)
+    if range_end is not None:
+        passes = passes.filter(start_time__lte=range_end + reset)
+    if satellites is not None or groundstations is not None:
+        passes = passes.filter(
+            Q(satellite__in=satellites or [])
+            | Q(groundstation__in=groundstations or [])
+        )
+    passes = passes.values_list(
+        "uuid", "satellite_id", "groundstation_id", "start_time", "end_time"
+    )
+
+    by_asset = defaultdict(list)
+    for uuid, sat, gs, start_time, end_time in passes.iterator():
+        interval = (start_time - reset, end_time, (uuid, start_time, end_time))
+        by_asset["satellite", sat].append(interval)
+        by_asset["groundstation", gs].append(interval)
+
+    report = []
+    for (asset_type, hwid), intervals in by_asset.items():
+        if satellites is not None or groundstations is not None:
+            wanted = satellites if asset_type == "satellite" else groundstations
+            if wanted is None or hwid not in wanted:
+                continue
+        for group in overlapping_groups(intervals):
+            report.append(
+                {
+                    asset_type: hwid,
+                    "start_time": min(item[1] for _, _, item in group),
+                    "end_time": max(item[2] for _, _, item in group),
+                    "passes": [item[0] for _, _, item in group],
+                }
+            )
+    return sorted(report, key=lambda group: group["start_time"])
@@ -1,9 +1,11 @@
 import json
-import sys
 
-from collections import namedtuple, Mapping
 from textwrap import dedent
 
+import numpy as np
+
+from v0.time import tt_iso
+
 
 class LeafOptions(object):
     __slots__ = [
@@ -52,31 +54,55 @@ class LeafPassFile(object):
     """
     ).strip()
     line_template = "{azimuth:.2f}, {altitude:.2f}, {range:.2f}, 0.0;"
-
-    def __init__(self, track, leafoptions):
+    # printf-style equivalent of line_template, so the whole body can be
+    # formatted in a single call instead of once per line
+    line_format = "%.2f, %.2f, %.2f, 0.0;"
+    # Yep... they need \r\n ... what even is this?
+    newline = "\r\n"
+
+    def __init__(self, azimuth, altitude, _range, leafoptions):
+        """takes the track as arrays of azimuth (deg), altitude (deg) and
+        range (km), one element per line of the pass file.
+        """
         self.options = leafoptions
-        self.lines = []
-        track = list(track)
-        azs = [step["azimuth"] for step in track]
-        alts = [step["altitude"] for step in track]
+        azimuth = np.array(azimuth, dtype=float)
+        altitude = np.asarray(altitude, dtype=float)
+        _range = np.asarray(_range, dtype=float)
 
         # ensure track always crosses 0, and not 360
-        sorted_azs = sorted(azs)
-        is_contiguous = sorted_azs == azs or list(reversed(sorted_azs)) == azs
-        if not is_contiguous and max(azs) > 180.0:
-            for step in track:
-                if step["azimuth"] > 180.0:
-                    step["azimuth"] -= 360
-
-        self.track = track
+        az_step = np.diff(azimuth)
+        is_contiguous = (az_step >= 0.0).all() or (az_step <= 0.0).all()
+        if not is_contiguous and azimuth.max() > 180.0:
+            azimuth[azimuth > 180.0] -= 360
 
         # normal altitude bounds set by horizon_mask
-        if min(alts) < 0.0:
+        if altitude.min() < 0.0:
             msg = "Altitude ({altitude}) is out of bounds"
-            raise ValueError(msg.format(azimuth=min(alts)))
+            raise ValueError(msg.format(altitude=altitude.min()))
 
-        # format body lines
-        self._body = [self.line_template.format(**step) for step in track]
+        self.azimuth = azimuth
+        self.altitude = altitude
+        self.range = _range
+
+    @classmethod
+    def _format_body(cls, azimuth, altitude, _range):
+        if not len(azimuth):
+            return b""
+        columns = np.column_stack((azimuth, altitude, _range))
+        line = cls.line_format + cls.newline
+        body = (line * len(columns)) % tuple(columns.ravel().tolist())
+        return body[: -len(cls.newline)].encode("ascii")
+
+    @classmethod
+    def from_track(cls, track, leafoptions):
+        """builds a pass file from a list of track points
+        (dicts with azimuth, altitude and range keys)
+        """
+        track = list(track)
+        azimuth = [step["azimuth"] for step in track]
+        altitude = [step["altitude"] for step in track]
+        _range = [step["range"] for step in track]
+        return cls(azimuth, altitude, _range, leafoptions)
 
     @property
     def header(self):
@@ -88,11 +114,10 @@ class LeafPassFile(object):
             leafoptions = LeafOptions()
 
         dt = leafoptions.DT
-        track = access.iter_track(dt)
+        _times, altitude, azimuth, _range = access.track_arrays(dt)
 
         def _fmt_time(t):
-            time_str = t.utc_iso(" ", 6)
-            date, time = time_str.split(" ")
+            date, time = tt_iso(t).split("T")
             return time[:-1]  # leave off Z
 
         leafoptions.update(
@@ -104,11 +129,25 @@ class LeafPassFile(object):
                 "LOS": _fmt_time(access.end_time),
             }
         )
-        return cls(track, leafoptions)
+        return cls(azimuth, altitude, _range, leafoptions)
+
+    def iter_bytes(self, lines=256):
+        """yields the pass file in chunks of (at most) `lines` body lines,
+        after the header, so it can be streamed
+        """
+        yield self.newline.join(self.header.splitlines()).encode()
+        newline = self.newline.encode()
+        for i in range(0, len(self.azimuth), lines):
+            chunk = slice(i, i + lines)
+            yield newline + self._format_body(
+                self.azimuth[chunk], self.altitude[chunk], self.range[chunk]
+            )
+
+    def __bytes__(self):
+        return b"".join(self.iter_bytes())
 
     def __repr__(self):
-        # Yep... they need \r\n ... what even is this?
-        return "\r\n".join(self.header.splitlines() + self._body)
+        return bytes(self).decode()
 
     @property
     def json(self):
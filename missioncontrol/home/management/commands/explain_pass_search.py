@@ -0,0 +1,137 @@
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from home.models import Pass
+from v0.passes import search_queryset
+from v0.time import utc
+
+SEED_SATELLITES = 1000
+SEED_GROUNDSTATIONS = 50
+SEED_SLOT_MINUTES = 13
+
+INDEX_RE = re.compile(r"Index (?:Only )?Scan(?: Backward)? (?:using|on) (\w+)")
+
+# every groundstation has a 10 minute pass in each slot, each on a different
+# satellite, so nothing conflicts. passes before the last 10000 slots are
+# mostly stale, like an old schedule.
+SEED_SQL = f"""
+INSERT INTO home_satellite (hwid, catid, tle, logger_state)
+SELECT 'sat' || i, '', NULL, NULL FROM generate_series(0, {SEED_SATELLITES - 1}) i
+ON CONFLICT DO NOTHING;
+
+INSERT INTO home_groundstation (
+    hwid, latitude, longitude, elevation, horizon_mask, passes_read_only
+)
+SELECT 'gs' || i, 0, 0, 0, '[]', false
+FROM generate_series(0, {SEED_GROUNDSTATIONS - 1}) i
+ON CONFLICT DO NOTHING;
+
+INSERT INTO home_pass (
+    uuid, access_id, satellite_id, groundstation_id, start_time, end_time,
+    scheduled_on_sat, scheduled_on_gs, is_desired, is_valid, time_range
+)
+SELECT
+    md5(k::text || '-' || g)::uuid, '',
+    'sat' || ((k + 20 * g) %% {SEED_SATELLITES}), 'gs' || g,
+    t, t + interval '10 minutes',
+    false, false, k >= %(slots)s - 10000 OR (k + g) %% 5 = 0, true,
+    tstzrange(t - interval '90 seconds', t + interval '10 minutes', '[]')
+FROM
+    generate_series(0, %(slots)s - 1) k,
+    generate_series(0, {SEED_GROUNDSTATIONS - 1}) g,
+    LATERAL (
+        SELECT %(start)s + k * interval '{SEED_SLOT_MINUTES} minutes' AS t
+    ) s;
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "print the EXPLAIN (ANALYZE) of the pass search queries, optionally "
+        "seeding a scratch database with synthetic passes first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            metavar="SLOTS",
+            help=(
+                f"insert SLOTS x {SEED_GROUNDSTATIONS} passes, "
+                f"{SEED_SLOT_MINUTES} minutes apart, on sat0..sat"
+                f"{SEED_SATELLITES - 1} and gs0..gs{SEED_GROUNDSTATIONS - 1}. "
+                "200000 slots is 10M passes. only use a scratch database"
+            ),
+        )
+        parser.add_argument("--seed-start", default="2022-01-01T00:00:00Z")
+        parser.add_argument(
+            "--range-start", default=None, help="like search, defaults to now"
+        )
+        parser.add_argument(
+            "--range-end", default=None, help="defaults to two days after the start"
+        )
+        parser.add_argument("--satellite", default="sat7")
+        parser.add_argument("--groundstation", default="gs3")
+
+    def seed(self, slots, start):
+        if Pass.objects.exists():
+            raise CommandError("Passes already exist, seed an empty database")
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(SEED_SQL, {"slots": slots, "start": start})
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE home_pass")
+        self.stdout.write(f"Seeded {Pass.objects.count()} passes")
+
+    def explain(self, name, passes):
+        sql, params = passes.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+            plan = [row[0] for row in cursor.fetchall()]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+        self.stdout.write("\n".join(plan))
+        indexes = sorted(set(INDEX_RE.findall("\n".join(plan))))
+        [time] = [line for line in plan if line.startswith("Execution Time")]
+        self.summary.append(f"{name}: {time[16:]}, {', '.join(indexes) or 'no index'}")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(options["seed"], utc(options["seed_start"]))
+
+        # the default range of a search, if none is given
+        range_start = utc(options["range_start"] or "now")
+        if options["range_end"] is None:
+            range_end = range_start + datetime.timedelta(days=2)
+        else:
+            range_end = utc(options["range_end"])
+        sat, gs = options["satellite"], options["groundstation"]
+
+        def page(**kwargs):
+            return search_queryset(range_start, range_end, **kwargs)[:100]
+
+        self.summary = []
+        self.explain("all assets", page())
+        self.explain("all assets, stale too", page(show_stale=True))
+        self.explain("all assets, starting in the range", page(range_inclusive="end"))
+        self.explain("one satellite", page(satellites=[sat]))
+        self.explain("one groundstation", page(groundstations=[gs]))
+        self.explain(
+            "one groundstation, stale too", page(groundstations=[gs], show_stale=True)
+        )
+
+        # the next pages continue on the same index from the last pass
+        for order_by in ["start_time", "-start_time"]:
+            last = page(order_by=order_by).values_list("start_time", "uuid")
+            last = list(last)[-1:]
+            if not last:
+                self.stdout.write(f"No passes in the range to page by {order_by}")
+                continue
+            self.explain(
+                f"all assets, next page by {order_by}",
+                page(order_by=order_by, after=last[0]),
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("== summary"))
+        self.stdout.write("\n".join(self.summary))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from home.intervals import conflict_report
+from v0.time import utc
+
+
+class Command(BaseCommand):
+    help = "report the groups of passes that conflict"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--range-start", default=None)
+        parser.add_argument("--range-end", default=None)
+        parser.add_argument("--satellites", nargs="+", default=None)
+        parser.add_argument("--groundstations", nargs="+", default=None)
+
+    def handle(self, *args, **options):
+        range_start = options["range_start"]
+        range_end = options["range_end"]
+        report = conflict_report(
+            None if range_start is None else utc(range_start),
+            None if range_end is None else utc(range_end),
+            options["satellites"],
+            options["groundstations"],
+        )
+        for group in report:
+            asset = group.get("satellite") or group.get("groundstation")
+            passes = " ".join(str(uuid) for uuid in group["passes"])
+            self.stdout.write(
+                f"{asset} {group['start_time']} - {group['end_time']}: {passes}"
+            )
+        if report:
+            raise CommandError(f"Found {len(report)} groups of conflicting passes")
+        self.stdout.write(self.style.SUCCESS("No conflicting passes"))
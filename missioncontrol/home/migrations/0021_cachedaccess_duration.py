@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+# one UPDATE instead of a save per row, placeholders have no duration
+SET_DURATIONS = """
+UPDATE home_cachedaccess
+SET duration = EXTRACT(EPOCH FROM end_time - start_time)
+WHERE NOT placeholder
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("home", "0020_merge_20190124_0028")]
+
+    operations = [
+        migrations.AddField(
+            model_name="cachedaccess",
+            name="duration",
+            field=models.FloatField(blank=True, help_text="In seconds", null=True),
+        ),
+        migrations.RunSQL(SET_DURATIONS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="cachedaccess",
+            index=models.Index(
+                fields=["bucket_hash", "max_alt", "duration"],
+                name="cachedaccess_filter_idx",
+            ),
+        ),
+    ]
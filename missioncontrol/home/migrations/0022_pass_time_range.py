@@ -0,0 +1,41 @@
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+# GS_RESET_TIME_S when this migration was written
+GS_RESET_TIME_S = 90
+
+# The constraints that need time_range are added by the next migration.
+# Passes saved before these migrations weren't checked for every kind of
+# conflict, so between the two run
+#   ./manage.py migrate home 0022_pass_time_range
+#   ./manage.py pass_conflicts
+# and fix (or make stale) the passes it reports, then migrate the rest.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("home", "0021_cachedaccess_duration")]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name="pass",
+            name="time_range",
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(
+            "UPDATE home_pass SET time_range = tstzrange("
+            f"start_time - interval '{GS_RESET_TIME_S} seconds', end_time, '[]')",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="pass",
+            name="time_range",
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(
+                blank=True, editable=False
+            ),
+        ),
+    ]
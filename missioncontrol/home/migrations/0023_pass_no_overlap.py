@@ -0,0 +1,27 @@
+from django.db import migrations
+
+NOT_STALE = "is_desired OR scheduled_on_sat OR scheduled_on_gs"
+
+# this fails if any passes conflict, see migration 0022 for how to find and
+# fix them first.
+# the constraints are deferrable, so a transaction that moves several passes
+# at once (see `v0.passes.bulk_put`) can defer them until it commits
+EXCLUSION_CONSTRAINTS = [
+    ("pass_groundstation_no_overlap", "groundstation_id"),
+    ("pass_satellite_no_overlap", "satellite_id"),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("home", "0022_pass_time_range")]
+
+    operations = [
+        migrations.RunSQL(
+            f"ALTER TABLE home_pass ADD CONSTRAINT {name} EXCLUDE USING gist "
+            f"({column} WITH =, time_range WITH &&) WHERE ({NOT_STALE}) "
+            "DEFERRABLE INITIALLY IMMEDIATE",
+            f"ALTER TABLE home_pass DROP CONSTRAINT {name}",
+        )
+        for name, column in EXCLUSION_CONSTRAINTS
+    ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.indexes import GistIndex
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("home", "0023_pass_no_overlap")]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pass",
+            index=models.Index(
+                fields=["groundstation", "start_time"], name="pass_gs_start_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pass",
+            index=models.Index(
+                fields=["satellite", "start_time"], name="pass_sat_start_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pass",
+            index=models.Index(
+                condition=models.Q(
+                    ("scheduled_on_sat", True),
+                    ("scheduled_on_gs", True),
+                    ("is_desired", True),
+                    _connector="OR",
+                ),
+                fields=["start_time"],
+                name="pass_not_stale_start_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pass",
+            index=GistIndex(fields=["time_range"], name="pass_time_range_idx"),
+        ),
+    ]
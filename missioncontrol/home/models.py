@@ -2,69 +2,49 @@ import logging
 import six
 
 from datetime import timedelta
-from itertools import chain
 from uuid import uuid4
 
 from connexion.exceptions import ProblemException
 from django.apps import apps
-from django.contrib.postgres.fields import JSONField
 from django.conf import settings
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.contrib.postgres.fields import JSONField, HStoreField
-from django.db import models, transaction
+from django.contrib.postgres.fields import JSONField, HStoreField, DateTimeRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.db import models, transaction, IntegrityError
 from django import forms
 from django.db.models import Q
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.utils import timezone, dateformat
+from psycopg2.errorcodes import EXCLUSION_VIOLATION
+from psycopg2.extras import DateTimeTZRange
 from pytz import UTC
 from skyfield.api import Topos, EarthSatellite
 
-GS_RESET_TIME_S = 90  # FIXME this is a wag
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+from home.serializers import serializer
 
+GS_RESET_TIME_S = 90  # FIXME this is a wag
 
-LOCK_MODES = (
-    "ACCESS SHARE",
-    "ROW SHARE",
-    "ROW EXCLUSIVE",
-    "SHARE UPDATE EXCLUSIVE",
-    "SHARE",
-    "SHARE ROW EXCLUSIVE",
-    "EXCLUSIVE",
-    "ACCESS EXCLUSIVE",
+# changes to any other pass field can't make it conflict with another pass
+PASS_SCHEDULING_FIELDS = (
+    "start_time",
+    "end_time",
+    "satellite_id",
+    "groundstation_id",
+    "is_desired",
+    "scheduled_on_sat",
+    "scheduled_on_gs",
+)
+PASS_NOT_STALE = Q(scheduled_on_sat=True) | Q(scheduled_on_gs=True) | Q(is_desired=True)
+# the exclusion constraints that keep passes that aren't stale from
+# conflicting, see migration 0023
+PASS_EXCLUSION_CONSTRAINTS = (
+    "pass_groundstation_no_overlap",
+    "pass_satellite_no_overlap",
 )
 
-
-def require_lock(lock):
-    """
-    Decorator for PostgreSQL's table-level lock functionality
-
-    Example:
-        @transaction.commit_on_success
-        @require_lock(MyModel, 'ACCESS EXCLUSIVE')
-        def save(self, *args, **kwargs):
-            super().save(*args, **kwargs)
-
-    PostgreSQL's LOCK Documentation:
-    http://www.postgresql.org/docs/8.3/interactive/sql-lock.html
-    """
-
-    def require_lock_decorator(view_func):
-        def wrapper(model, *args, **kwargs):
-            if lock not in LOCK_MODES:
-                raise ValueError("%s is not a PostgreSQL supported lock mode.")
-            from django.db import connection
-
-            cursor = connection.cursor()
-            cursor.execute("LOCK TABLE %s IN %s MODE" % (model._meta.db_table, lock))
-            return view_func(model, *args, **kwargs)
-
-        return wrapper
-
-    return require_lock_decorator
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
 
 
 @receiver(pre_save)
@@ -107,19 +87,19 @@ class Serializable(object):
         serialized.
     """
 
-    def to_dict(self):
-        """ Adapted from django.forms.models.model_to_dict()
-            https://docs.djangoproject.com/en/2.1/_modules/django/forms/models/
+    # fields that are left out of to_dict
+    serialize_exclude = ()
+
+    @classmethod
+    def serializer(cls):
+        return serializer(cls)
 
-            The main difference is that this includes fields that are not editable.
+    def to_dict(self):
+        """ Like django.forms.models.model_to_dict(), but includes fields that
+            are not editable. The fields are looked up once per model, see
+            `home.serializers.Serializer`.
         """
-        opts = self._meta
-        data = {}
-        for f in chain(opts.concrete_fields, opts.private_fields, opts.many_to_many):
-            if f.name is "id":
-                continue
-            data[f.name] = f.value_from_object(self)
-        return data
+        return self.serializer().to_dict(self)
 
 
 class ActiveTaskStacks(models.Manager):
@@ -351,7 +331,6 @@ class HistoricalPasses(models.Manager):
 
 
 class Pass(models.Model, Serializable):
-    # TODO conflicts when passes overlap (or are within antenna reset time)
     uuid = models.UUIDField(default=uuid4, editable=False, unique=True)
     access_id = models.CharField(max_length=100, blank=True)
     satellite = models.ForeignKey(Satellite, on_delete=models.PROTECT, to_field="hwid")
@@ -376,6 +355,12 @@ class Pass(models.Model, Serializable):
         TaskStack, null=True, blank=True, on_delete=models.SET_NULL, to_field="uuid"
     )
     attributes = HStoreField(null=True, blank=True)
+    # [start_time - GS_RESET_TIME_S, end_time], set on save. The database
+    # won't let the ranges of passes that aren't stale overlap on the same
+    # satellite or groundstation (see migration 0023)
+    time_range = DateTimeRangeField(blank=True, editable=False)
+
+    serialize_exclude = ("time_range",)
 
     objects = models.Manager()
     upcoming = UpcomingPasses()
@@ -384,46 +369,107 @@ class Pass(models.Model, Serializable):
 
     class Meta(object):
         verbose_name_plural = "Passes"
+        indexes = [
+            models.Index(
+                fields=["groundstation", "start_time"], name="pass_gs_start_idx"
+            ),
+            models.Index(fields=["satellite", "start_time"], name="pass_sat_start_idx"),
+            models.Index(
+                fields=["start_time"],
+                name="pass_not_stale_start_idx",
+                condition=PASS_NOT_STALE,
+            ),
+            # finds the passes in a range of any asset, without the lower
+            # start_time bound that pass lengths don't give
+            GistIndex(fields=["time_range"], name="pass_time_range_idx"),
+        ]
 
     @transaction.atomic
-    @require_lock("SHARE ROW EXCLUSIVE")
     def save(self, *args, **kwargs):
-        # Make this locked, so only a single process can save a Pass at a time,
-        # otherwise conflicting passes may be added.
-        # (as the constraint cannot be added to the db directly)
-        # Conflict check is done inside `Pass.clean` which is called via `pre_save_handler`
-        super().save(*args, **kwargs)
+        # Conflicting passes are rejected by exclusion constraints, which only
+        # lock the rows they conflict with, so passes on other satellites and
+        # groundstations can be saved at the same time.
+        # `Pass.clean`, which is called via `pre_save_handler`, sets the
+        # time_range and checks for conflicts first, to give a nicer error.
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"start_time", "end_time"} & set(
+            update_fields
+        ):
+            kwargs["update_fields"] = set(update_fields) | {"time_range"}
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as e:
+            if getattr(e.__cause__, "pgcode", None) != EXCLUSION_VIOLATION:
+                raise
+            raise self.conflict_error(self.conflicts())
+        self._saved_scheduling = self._scheduling()
 
-    def clean(self):
-        stale = not (self.is_desired or self.scheduled_on_sat or self.scheduled_on_gs)
-        if stale:
-            return
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_scheduling = instance._scheduling()
+        return instance
+
+    def _scheduling(self):
+        # deferred fields are left out, rather than loading them
+        return {
+            field: self.__dict__[field]
+            for field in PASS_SCHEDULING_FIELDS
+            if field in self.__dict__
+        }
+
+    @property
+    def scheduling_changed(self):
+        """whether any field that can make this pass conflict with another has
+        changed since it was loaded or saved
+        """
+        saved = getattr(self, "_saved_scheduling", None)
+        if self._state.adding or saved is None:
+            return True
+        return saved != self._scheduling()
 
+    @property
+    def is_stale(self):
+        return not (self.is_desired or self.scheduled_on_sat or self.scheduled_on_gs)
+
+    def reset_range(self):
         gs_reset_time = timedelta(seconds=GS_RESET_TIME_S)
-        overlap_range = (self.start_time - gs_reset_time, self.end_time)
-        start_overlaps_qs = Q(start_time__range=overlap_range)
-        end_overlaps_qs = Q(end_time__range=overlap_range)
-        not_stale = (
-            Q(scheduled_on_sat=True) | Q(scheduled_on_gs=True) | Q(is_desired=True)
-        )
+        return DateTimeTZRange(self.start_time - gs_reset_time, self.end_time, "[]")
+
+    def conflicts(self):
+        """the passes that aren't stale, on the same satellite or groundstation,
+        that are within GS_RESET_TIME_S of this one
+        """
         same_sat = Q(satellite=self.satellite)
         same_gs = Q(groundstation=self.groundstation)
         different_id = ~Q(uuid=self.uuid)
-        overlapping_pass_qs = Pass.objects.filter(
-            (same_gs | same_sat)
-            & different_id
-            & not_stale
-            & (start_overlaps_qs | end_overlaps_qs)
+        overlaps = Q(time_range__overlap=self.reset_range())
+        return Pass.objects.filter(
+            (same_gs | same_sat) & different_id & PASS_NOT_STALE & overlaps
         )
-        overlaps = overlapping_pass_qs.all()
+
+    @staticmethod
+    def conflict_error(overlaps):
+        ext = {"conflicts": [p.to_dict() for p in overlaps]}
+        return ProblemException(
+            status=409,
+            title="Conflict",
+            detail="The provided pass conflicts with one on the server",
+            ext=ext,
+        )
+
+    def clean(self):
+        if not self.scheduling_changed:
+            return
+
+        self.time_range = self.reset_range()
+        if self.is_stale:
+            return
+
+        overlaps = self.conflicts().all()
         if overlaps:
-            ext = {"conflicts": [p.to_dict() for p in overlaps]}
-            raise ProblemException(
-                status=409,
-                title="Conflict",
-                detail="The provided pass conflicts with one on the server",
-                ext=ext,
-            )
+            raise self.conflict_error(overlaps)
 
     def refresh_tle(self):
         self.source_tle = self.satellite.tle
@@ -492,10 +538,17 @@ class CachedAccess(models.Model):
     end_time = ISODateTimeField(blank=True, null=True)
     modified = ISODateTimeField(auto_now=True)
     max_alt = models.FloatField(blank=True, null=True)
+    duration = models.FloatField(blank=True, null=True, help_text="In seconds")
     placeholder = models.BooleanField(default=False)
 
     class Meta:
         unique_together = ("bucket_hash", "bucket_index")
+        indexes = [
+            models.Index(
+                fields=["bucket_hash", "max_alt", "duration"],
+                name="cachedaccess_filter_idx",
+            )
+        ]
 
     @classmethod
     def invalidate_satellite(cls, satellite):
@@ -514,12 +567,15 @@ class CachedAccess(models.Model):
             "max_alt": self.max_alt,
         }
 
-    def to_access(self, base_url=""):
+    def to_access(self, base_url="", satellite=None, groundstation=None):
+        """satellite and groundstation can be passed in when they are already
+        loaded, to save looking them up for every cached access
+        """
         return Access(
             self.start_time,
             self.end_time,
-            self.satellite,
-            self.groundstation,
+            satellite or self.satellite,
+            groundstation or self.groundstation,
             self.max_alt,
             base_url=base_url,
         )
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from functools import partial
+
+from numpy import asarray, concatenate, flatnonzero, lexsort, zeros
+
+from home.intervals import IntervalIndex
+from home.models import GS_RESET_TIME_S
+from v0.accesses import (
+    ACCESS_DTYPE,
+    CachedAccessCalculator,
+    free_mask,
+    rows_to_accesses,
+)
+
+
+def candidate_rows(
+    sats, gss, range_start, range_end, min_max_alt=None, min_duration=None
+):
+    """the access rows a pass could be made of, those within the range that
+    don't conflict with the passes that are already there.
+    """
+    chunks = CachedAccessCalculator.iter_rows(
+        sats,
+        gss,
+        range_start,
+        range_end,
+        range_inclusive="neither",
+        min_max_alt=min_max_alt,
+        min_duration=min_duration,
+        row_filter=partial(free_mask, sats=sats, gss=gss),
+    )
+    chunks = list(chunks)
+    if not chunks:
+        return zeros(0, dtype=ACCESS_DTYPE)
+    return concatenate(chunks)
+
+
+def schedule_rows(rows, sat_weights, gs_weights):
+    """picks the access rows of a schedule without conflicts, rows that are
+    no closer than GS_RESET_TIME_S on a satellite or groundstation, that has
+    as much weighted contact time as it can.
+    a row's weight is its duration, times the weights of its satellite and
+    groundstation (arrays by index), rows with no weight are left out.
+
+    this is greedy, the heaviest rows are taken first (the earliest on a tie)
+    if they fit, each check and insert is a bisection of the intervals taken
+    on the satellite and groundstation.
+    returns the rows taken, in their order.
+    """
+    weights = (rows["end"] - rows["start"]) * sat_weights[rows["sat"]]
+    weights *= gs_weights[rows["gs"]]
+    order = lexsort((rows["start"], -weights))
+    starts = (rows["start"] - GS_RESET_TIME_S).tolist()
+    ends = rows["end"].tolist()
+    sats, gss = rows["sat"].tolist(), rows["gs"].tolist()
+
+    taken = zeros(len(rows), dtype=bool)
+    sat_busy = defaultdict(lambda: IntervalIndex([]))
+    gs_busy = defaultdict(lambda: IntervalIndex([]))
+    for i in order[weights[order] > 0].tolist():
+        sat, gs = sat_busy[sats[i]], gs_busy[gss[i]]
+        if sat.overlaps(starts[i], ends[i]) or gs.overlaps(starts[i], ends[i]):
+            continue
+        sat.add(starts[i], ends[i])
+        gs.add(starts[i], ends[i])
+        taken[i] = True
+    return rows[flatnonzero(taken)]
+
+
+def schedule(
+    sats,
+    gss,
+    range_start,
+    range_end,
+    priorities=None,
+    min_max_alt=None,
+    min_duration=None,
+    base_url="",
+):
+    """schedules the accesses between satellites and groundstations in a
+    range, around the passes that are already there, see `schedule_rows`.
+    priorities are weights by satellite and groundstation hwid, like
+    {"satellites": {hwid: weight}, "groundstations": {hwid: weight}}, the
+    default weight is 1.
+    groundstations that have read only passes are left out.
+    returns the accesses, in `Access.sort_key` order.
+    """
+    priorities = priorities or {}
+    sats = list(sats)
+    gss = [gs for gs in gss if not gs.passes_read_only]
+
+    sat_priorities = priorities.get("satellites", {})
+    gs_priorities = priorities.get("groundstations", {})
+    sat_weights = asarray([sat_priorities.get(sat.hwid, 1.0) for sat in sats])
+    gs_weights = asarray([gs_priorities.get(gs.hwid, 1.0) for gs in gss])
+
+    rows = candidate_rows(sats, gss, range_start, range_end, min_max_alt, min_duration)
+    rows = schedule_rows(rows, sat_weights, gs_weights)
+    return rows_to_accesses(rows, sats, gss, base_url=base_url)
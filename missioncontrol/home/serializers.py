@@ -0,0 +1,87 @@
+from functools import lru_cache
+from itertools import chain
+from operator import attrgetter
+
+from django.db import models
+from pytz import UTC
+
+
+def encode_datetime(t):
+    """the ISO 8601 UTC string of a datetime, e.g. 2018-05-23T01:02:03.123456Z"""
+    if t.utcoffset():
+        t = t.astimezone(UTC)
+    return t.replace(tzinfo=None).isoformat(timespec="microseconds") + "Z"
+
+
+def _encoder(field):
+    """the function that makes a field's values ready for json, or None if
+    they already are
+    """
+    if field.is_relation and field.many_to_one:
+        field = field.target_field
+    if isinstance(field, models.DateTimeField):
+        return encode_datetime
+    if isinstance(field, models.UUIDField):
+        return str
+    return None
+
+
+class Serializer(object):
+    """turns model instances, or rows of their fields, into dicts.
+    the fields, and how to read and encode them, are looked up once from the
+    model's _meta, see `serializer`.
+    """
+
+    def __init__(self, model, exclude=()):
+        opts = model._meta
+        fields = [
+            f
+            for f in chain(opts.concrete_fields, opts.private_fields, opts.many_to_many)
+            if f.name != "id" and f.name not in exclude
+        ]
+        self.model = model
+        self.names = [f.name for f in fields]
+        self.getters = [
+            attrgetter(f.attname) if f.concrete else f.value_from_object for f in fields
+        ]
+        # rows can only be read for fields that are columns
+        self.columns = None
+        if all(f.concrete for f in fields):
+            self.columns = [f.attname for f in fields]
+        self.encoders = [
+            (f.name, _encoder(f)) for f in fields if _encoder(f) is not None
+        ]
+
+    def to_dict(self, obj):
+        """the field values of an instance, by field name"""
+        return {name: get(obj) for name, get in zip(self.names, self.getters)}
+
+    def encode(self, data):
+        """makes the datetimes and uuids of a `to_dict` ready for json"""
+        for name, encode in self.encoders:
+            value = data[name]
+            if value is not None:
+                data[name] = encode(value)
+        return data
+
+    def dump(self, obj):
+        """an instance as a dict that is ready for json"""
+        return self.encode(self.to_dict(obj))
+
+    def dump_rows(self, queryset):
+        """`dump` for each result of a queryset. the fields are read with
+        `values_list`, without making instances.
+        """
+        if self.columns is None:
+            return [self.dump(obj) for obj in queryset]
+        names = self.names
+        return [
+            self.encode(dict(zip(names, row)))
+            for row in queryset.values_list(*self.columns)
+        ]
+
+
+@lru_cache(maxsize=None)
+def serializer(model):
+    """the `Serializer` of a model, built the first time it is asked for"""
+    return Serializer(model, exclude=getattr(model, "serialize_exclude", ()))
@@ -1,3 +1,5 @@
+import json
+
 from contextlib import contextmanager
 from base64 import b64encode
 from uuid import uuid4
@@ -127,6 +129,27 @@ def simple_pass(simple_sat, simple_gs):
     }
 
 
+@pytest.fixture
+def create_assets(test_client):
+    """PUT each (asset_type, asset), e.g. ("satellite", simple_sat)"""
+
+    def create(*assets):
+        for asset_type, asset in assets:
+            response = test_client.put(
+                f"/api/v0/{asset_type}s/{asset['hwid']}/",
+                headers={"content-type": "application/json"},
+                data=json.dumps(asset),
+            )
+            assert response.status_code in (200, 201)
+
+    return create
+
+
+@pytest.fixture
+def created_assets(create_assets, simple_sat, simple_gs):
+    create_assets(("satellite", simple_sat), ("groundstation", simple_gs))
+
+
 @pytest.fixture
 def some_uuid():
     return str(uuid4())
@@ -1,9 +1,9 @@
-import json
 import pytest
 
 from skyfield.api import Loader
 from django.conf import settings
 from v0.accesses import Access, filter_range
+from home.models import CachedAccess, Satellite, GroundStation
 
 load = Loader(settings.EPHEM_DIR)
 timescale = load.timescale(builtin=True)
@@ -17,6 +17,30 @@ def test_access_id_roundtrip():
     assert (sat_id, gs_id, time) == Access.decode_access_id(accid)
 
 
+def test_access_id_rounds_to_nearest_second():
+    time = timescale.utc(2019, 12, 31, 23, 59, 59.6)
+    accid = Access.encode_access_id(123, 4567, time)
+    assert (123, 4567, timescale.utc(2020, 1, 1)) == Access.decode_access_id(accid)
+
+
+def test_legacy_access_id_decodes():
+    time = timescale.utc(2018, 5, 23, 1, 2, 3)
+    assert (5, 6, time) == Access.decode_access_id("ad7YTDdd7P6bxmYQGQEoiw==")
+
+
+def test_legacy_access_id_roundtrip():
+    time = timescale.utc(2019, 12, 31, 23, 59, 59)
+    accid = Access._encode_legacy_access_id(123, 4567, time)
+    assert (123, 4567, time) == Access.decode_access_id(accid)
+
+
+def test_access_id_checksum():
+    accid = Access.encode_access_id(5, 6, timescale.utc(2018, 5, 23, 1, 2, 3))
+    tampered = accid[:5] + ("A" if accid[5] != "A" else "B") + accid[6:]
+    with pytest.raises(ValueError):
+        Access.decode_access_id(tampered)
+
+
 class Window(object):
     ts = load.timescale(builtin=True)
 
@@ -48,3 +72,69 @@ def test_filter_range_inclusive_both(windows, range_inclusive, expected):
     range_end = ts.utc(2021)
     filtered = list(filter_range(windows, range_start, range_end, range_inclusive))
     assert filtered == expected
+
+
+def test_access_keeps_times_as_floats():
+    start = timescale.utc(2018, 5, 23, 1, 2, 3.25)
+    end = timescale.utc(2018, 5, 23, 1, 12, 4.5)
+    access = Access(start, end, None, None, 45.0)
+    assert not hasattr(access, "__dict__")
+    assert access.start_time.utc_iso(places=6) == start.utc_iso(places=6)
+    assert access.end_time.utc_iso(places=6) == end.utc_iso(places=6)
+    assert access.duration == pytest.approx(601.25, abs=1e-4)
+
+    clipped = access.clip(timescale.utc(2018, 5, 23, 1, 5), timescale.utc(2018, 6))
+    assert clipped.start_time.utc_iso() == "2018-05-23T01:05:00Z"
+    assert clipped.end_time.utc_iso(places=6) == end.utc_iso(places=6)
+    assert clipped.start_tai > access.start_tai
+    assert access < clipped and clipped > access
+
+
+@pytest.mark.django_db
+def test_access_from_id_uses_cache(
+    created_assets, test_client, simple_sat, simple_gs, monkeypatch
+):
+    params = {
+        "range_start": "2018-12-04T21:46:00Z",
+        "range_end": "2018-12-04T21:46:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    expected = response.json[0]
+
+    def from_time(*args, **kwargs):
+        raise AssertionError("cached access was solved again")
+
+    monkeypatch.setattr(Access, "from_time", from_time)
+    response = test_client.get(f"/api/v0/accesses/{expected['id']}/")
+    assert response.status_code == 200
+    assert response.json == expected
+    monkeypatch.undo()
+
+    # not in the cache, so it's solved
+    _, _, mid_time = Access.decode_access_id(expected["id"])
+    access = Access.from_time(mid_time, *_sat_gs(simple_sat, simple_gs))
+    CachedAccess.objects.all().delete()
+    assert Access.from_id(expected["id"]).to_dict() == access.to_dict()
+
+
+def _sat_gs(sat, gs):
+    return (
+        Satellite.objects.get(hwid=sat["hwid"]),
+        GroundStation.objects.get(hwid=gs["hwid"]),
+    )
+
+
+@pytest.mark.django_db
+def test_access_from_ids_computes_missing_buckets(
+    created_assets, test_client, simple_sat, simple_gs
+):
+    sat, gs = _sat_gs(simple_sat, simple_gs)
+    access = Access.from_time(timescale.utc(2018, 12, 4, 21, 46), sat, gs)
+    unknown_sat = Access.encode_access_id(sat.id + 1000, gs.id, access.start_time)
+
+    accesses = Access.from_ids([access.access_id, unknown_sat])
+    assert list(accesses) == [access.access_id]
+    assert CachedAccess.objects.exists()
+    assert accesses[access.access_id].start_time.tt == pytest.approx(
+        access.start_time.tt, abs=1e-6
+    )
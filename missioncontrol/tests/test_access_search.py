@@ -0,0 +1,317 @@
+import json
+import pytest
+import numpy as np
+
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from home.models import CachedAccess, Satellite, GroundStation, GS_RESET_TIME_S
+from v0.accesses import (
+    ACCESS_DTYPE,
+    AccessCalculator,
+    CachedAccessCalculator,
+    _find_accesses,
+    _pair_can_see,
+    filter_range,
+    range_mask,
+    rows_to_accesses,
+    sort_rows,
+    tai_seconds,
+)
+from v0.pagination import encode_cursor
+from v0.time import utc
+
+
+def _next_url(response):
+    link = response.headers.get("Link")
+    if link is None:
+        return None
+    url, rel = link.split(";")
+    assert rel.strip() == 'rel="next"'
+    url = urlsplit(url.strip("<>"))
+    return f"{url.path}?{url.query}"
+
+
+@pytest.mark.django_db
+def test_access_search_pagination(create_assets, test_client, simple_sat, simple_gs):
+    other_gs = dict(simple_gs, hwid="moonbase8", longitude=10.0)
+    create_assets(
+        ("satellite", simple_sat),
+        ("groundstation", simple_gs),
+        ("groundstation", other_gs),
+    )
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-28T00:00:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    assert response.status_code == 200
+    assert "Link" not in response.headers
+    expected = response.json
+    assert len(expected) > 5
+
+    pages = []
+    response = test_client.get("/api/v0/accesses/", query_string=dict(params, limit=2))
+    while True:
+        assert response.status_code == 200
+        pages.append(response.json)
+        url = _next_url(response)
+        if url is None:
+            break
+        response = test_client.get(url)
+
+    assert [a for page in pages for a in page] == expected
+    assert all(len(page) == 2 for page in pages[:-1])
+
+
+@pytest.mark.django_db
+def test_access_search_bad_cursor(test_client):
+    for cursor in [
+        "nope",
+        encode_cursor(["x", None, 1]),
+        encode_cursor([1.0, 2]),
+        encode_cursor([1.0, 2.0, 3]),
+        encode_cursor([True, 2, 3]),
+        encode_cursor([float("nan"), 2, 3]),
+    ]:
+        response = test_client.get("/api/v0/accesses/", query_string={"cursor": cursor})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_access_search_only_computes_needed_buckets(
+    created_assets, test_client, simple_sat, simple_gs
+):
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-12-05T00:00:00Z",
+        "limit": 2,
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    assert response.status_code == 200
+    assert len(response.json) == 2
+    buckets = CachedAccess.objects.values("bucket_hash").distinct().count()
+    assert 1 <= buckets <= 2
+
+
+@pytest.mark.parametrize(
+    "latitude, can_see", [(0.0, True), (56.0, True), (-62.0, False), (89.0, False)]
+)
+def test_pair_can_see(simple_sat, simple_gs, latitude, can_see):
+    sat = Satellite(**simple_sat)
+    gs = GroundStation(**dict(simple_gs, latitude=latitude))
+    assert _pair_can_see(sat, gs) == can_see
+
+    if not can_see:
+        ts = AccessCalculator.timescale
+        start, end = ts.utc(2018, 12, 1), ts.utc(2018, 12, 4)
+        _, _, found = _find_accesses(sat, gs, start, end, ts)
+        assert list(found) == []
+
+
+@pytest.mark.django_db
+def test_access_search_prunes_pairs(create_assets, test_client, simple_sat, simple_gs):
+    polar_gs = dict(simple_gs, hwid="polarbase", latitude=80.0)
+    create_assets(("satellite", simple_sat), ("groundstation", polar_gs))
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-28T00:00:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    assert response.status_code == 200
+    assert response.json == []
+    assert not CachedAccess.objects.exists()
+
+
+@pytest.mark.parametrize(
+    "latitude, horizon_mask",
+    [(0.0, [5] * 360), (45.0, [10] * 180 + [2] * 180), (58.0, [0] * 360)],
+)
+def test_find_accesses_matches_brute_force(
+    simple_sat, simple_gs, latitude, horizon_mask
+):
+    sat = Satellite(**simple_sat)
+    gs = GroundStation(**dict(simple_gs, latitude=latitude, horizon_mask=horizon_mask))
+    ts = AccessCalculator.timescale
+    start, end = ts.utc(2018, 12, 1), ts.utc(2018, 12, 1, 8)
+    _, _, found = _find_accesses(sat, gs, start, end, ts)
+    found = [
+        (rising.tai, setting.tai)
+        for rising, setting, _ in found
+        if start.tai <= rising.tai < end.tai
+    ]
+
+    # every other second
+    t = np.arange(start.tai - 0.05, end.tai + 0.05, 2.0 / 86400)
+    alt, az, _ = gs.observe(sat).at(ts.tai(jd=t)).altaz()
+    above = alt.degrees > np.asarray(horizon_mask)[az.degrees.astype(int)]
+    risings = t[1:][above[1:] & ~above[:-1]]
+    settings = t[1:][~above[1:] & above[:-1]]
+    risings = risings[(risings >= start.tai) & (risings < end.tai)]
+
+    assert len(risings) > 0
+    assert len(found) == len(risings)
+    for (rising, setting), brute_rising in zip(found, risings):
+        assert rising == pytest.approx(brute_rising, abs=2.5 / 86400)
+        assert setting == pytest.approx(settings[settings > rising][0], abs=2.5 / 86400)
+
+
+def test_find_accesses_filters(simple_sat, simple_gs):
+    sat = Satellite(**simple_sat)
+    gs = GroundStation(**simple_gs)
+    ts = AccessCalculator.timescale
+    start, end = ts.utc(2018, 12, 1), ts.utc(2018, 12, 3)
+    _, _, found = _find_accesses(sat, gs, start, end, ts)
+    found = [(r.tai, s.tai, max_alt) for r, s, max_alt in found]
+    expected = [
+        (r, s, max_alt)
+        for r, s, max_alt in found
+        if max_alt >= 20 and s - r > 360 / 86400
+    ]
+    assert 0 < len(expected) < len(found)
+
+    _, _, filtered = _find_accesses(
+        sat, gs, start, end, ts, min_max_alt=20, min_duration=360
+    )
+    assert [(r.tai, s.tai, max_alt) for r, s, max_alt in filtered] == expected
+
+
+@pytest.mark.django_db
+def test_access_search_filters(created_assets, test_client, simple_sat, simple_gs):
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-27T00:00:00Z",
+    }
+    filters = {"min_max_alt": 20, "min_duration": 360}
+
+    # the filtered search still caches every access
+    response = test_client.get(
+        "/api/v0/accesses/", query_string=dict(params, **filters)
+    )
+    assert response.status_code == 200
+    filtered = response.json
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    assert response.status_code == 200
+    accesses = response.json
+
+    def duration(access):
+        start = datetime.fromisoformat(access["start_time"][:-1])
+        end = datetime.fromisoformat(access["end_time"][:-1])
+        return (end - start).total_seconds()
+
+    expected = [a for a in accesses if a["max_alt"] >= 20 and duration(a) >= 360]
+    assert 0 < len(expected) < len(accesses)
+    assert filtered == expected
+
+    response = test_client.get(
+        "/api/v0/accesses/", query_string=dict(params, **filters)
+    )
+    assert response.json == expected
+
+
+def test_access_rows(simple_sat, simple_gs):
+    sats = [Satellite(**dict(simple_sat, id=7)), Satellite(**dict(simple_sat, id=3))]
+    gss = [GroundStation(**dict(simple_gs, id=1))]
+    ts = AccessCalculator.timescale
+    hour = 60 * 60
+    day = tai_seconds(ts.utc(2018, 12, 1))
+    rows = np.array(
+        [
+            (0, 0, day + 2 * hour, day + 3 * hour, 10.0),
+            (1, 0, day, day + hour, 20.0),
+            (0, 0, day, day + 2 * hour, 30.0),
+            (1, 0, day + 4 * hour, day + 5 * hour, 40.0),
+        ],
+        dtype=ACCESS_DTYPE,
+    )
+    sat_ids = np.array([sat.id for sat in sats])
+    gs_ids = np.array([gs.id for gs in gss])
+
+    rows = sort_rows(rows, sat_ids, gs_ids)
+    assert rows["max_alt"].tolist() == [20.0, 30.0, 10.0, 40.0]
+    accesses = rows_to_accesses(rows, sats, gss)
+    assert [a.sort_key for a in accesses] == sorted(a.sort_key for a in accesses)
+    assert [a.max_alt for a in accesses] == [20.0, 30.0, 10.0, 40.0]
+
+    range_start = ts.utc(2018, 12, 1, 1)
+    range_end = ts.utc(2018, 12, 1, 4, 30)
+    for range_inclusive in ["both", "start", "end", "neither"]:
+        mask = range_mask(rows, range_start, range_end, range_inclusive)
+        windows = filter_range(accesses, range_start, range_end, range_inclusive)
+        assert [a for a, keep in zip(accesses, mask) if keep] == list(windows)
+
+
+@pytest.mark.django_db
+def test_access_search_rows(create_assets, test_client, simple_sat, simple_gs):
+    north_gs = dict(simple_gs, hwid="northbase", latitude=50.0)
+    create_assets(
+        ("satellite", simple_sat),
+        ("groundstation", simple_gs),
+        ("groundstation", north_gs),
+    )
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-27T00:00:00Z",
+        "limit": 1000,
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    assert response.status_code == 200
+
+    sats = list(Satellite.objects.all())
+    gss = list(GroundStation.objects.order_by("-id"))
+    rows = CachedAccessCalculator.search_rows(
+        sats, gss, params["range_start"], params["range_end"], limit=1000
+    )
+    assert len(rows) == len(response.json)
+    assert set(rows["gs"].tolist()) == {0, 1}
+    accesses = rows_to_accesses(rows, sats, gss, base_url="http://localhost/")
+    assert [a.to_dict() for a in accesses] == response.json
+
+    first = CachedAccessCalculator.search_rows(
+        sats, gss, params["range_start"], params["range_end"], limit=3
+    )
+    assert first.tolist() == rows[:3].tolist()
+
+
+@pytest.mark.django_db
+def test_access_search_free_only(
+    create_assets, test_client, simple_sat, simple_gs, some_uuid
+):
+    near_gs = dict(simple_gs, hwid="nearbase", latitude=5.0)
+    create_assets(
+        ("satellite", simple_sat),
+        ("groundstation", simple_gs),
+        ("groundstation", near_gs),
+    )
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-27T00:00:00Z",
+        "limit": 1000,
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    accesses = response.json
+    taken = accesses[0]
+    response = test_client.put(
+        f"/api/v0/passes/{some_uuid}/",
+        headers={"content-type": "application/json"},
+        data=json.dumps({"access_id": taken["id"]}),
+    )
+    assert response.status_code == 201
+
+    response = test_client.get(
+        "/api/v0/accesses/", query_string=dict(params, free_only=True)
+    )
+    assert response.status_code == 200
+    # there is one satellite, so accesses near the pass on any groundstation
+    # conflict with it
+    reset = timedelta(seconds=GS_RESET_TIME_S)
+    pass_start, pass_end = utc(taken["start_time"]), utc(taken["end_time"])
+    free = [
+        access
+        for access in accesses
+        if utc(access["start_time"]) - reset > pass_end
+        or utc(access["end_time"]) < pass_start - reset
+    ]
+    assert taken not in response.json
+    assert len(free) < len(accesses) - 1
+    assert response.json == free
@@ -0,0 +1,141 @@
+import gzip
+import json
+import pytest
+import zlib
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from compression import (
+    CompressionMiddleware,
+    GZIP_WBITS,
+    is_acceptable,
+    parse_accept_encoding,
+)
+
+CONTENT_TYPES = {"application/json": ("br", "gzip"), "text/plain": ("gzip",)}
+
+
+def make_client(body, content_type="application/json", min_size=100):
+    def app(environ, start_response):
+        return Response(body, content_type=content_type)(environ, start_response)
+
+    middleware = CompressionMiddleware(app, CONTENT_TYPES, min_size=min_size)
+    return Client(middleware, Response)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("") == {}
+    assert parse_accept_encoding("gzip, deflate, br") == {
+        "gzip": 1.0,
+        "deflate": 1.0,
+        "br": 1.0,
+    }
+    assert parse_accept_encoding("br;q=0, GZIP;q=0.5") == {"br": 0.0, "gzip": 0.5}
+
+
+@pytest.mark.parametrize(
+    "header,coding,acceptable",
+    [
+        ("", "gzip", False),
+        ("", "identity", True),
+        ("gzip", "gzip", True),
+        ("gzip;q=0", "gzip", False),
+        ("*", "gzip", True),
+        ("*, gzip;q=0", "gzip", False),
+        ("*;q=0", "identity", False),
+        ("gzip, identity;q=0", "identity", False),
+        ("*;q=0, identity", "identity", True),
+    ],
+)
+def test_is_acceptable(header, coding, acceptable):
+    assert is_acceptable(parse_accept_encoding(header), coding) == acceptable
+
+
+def test_gzip():
+    body = json.dumps([{"azimuth": 1.0, "altitude": 2.0}] * 100)
+    client = make_client(body)
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(response.get_data()).decode() == body
+
+
+def test_brotli():
+    brotli = pytest.importorskip("brotli")
+    body = json.dumps([{"azimuth": 1.0, "altitude": 2.0}] * 100)
+    client = make_client(body)
+    response = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.get_data()).decode() == body
+
+
+def test_wildcard():
+    body = json.dumps([{"azimuth": 1.0, "altitude": 2.0}] * 100)
+    client = make_client(body, content_type="text/plain")
+    response = client.get("/", headers={"Accept-Encoding": "*"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()).decode() == body
+
+
+def test_identity_excluded():
+    client = make_client("x" * 10)
+    response = client.get("/", headers={"Accept-Encoding": "gzip, identity;q=0"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()).decode() == "x" * 10
+
+
+def test_streamed():
+    chunks = [b"%d, 45.0, 1000.0, 0.0;\r\n" % i for i in range(1000)]
+    client = make_client(iter(chunks), content_type="text/plain")
+    response = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()) == b"".join(chunks)
+
+
+def test_streamed_chunks_are_flushed():
+    chunks = [b"%d, 45.0, 1000.0, 0.0;\r\n" % i for i in range(3)]
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return iter(chunks)
+
+    middleware = CompressionMiddleware(app, CONTENT_TYPES)
+    environ = {"REQUEST_METHOD": "GET", "HTTP_ACCEPT_ENCODING": "gzip"}
+    app_iter = middleware(environ, lambda status, headers, exc_info=None: None)
+    # each chunk can be decompressed as soon as it is sent
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    for chunk, compressed in zip(chunks, app_iter):
+        assert decompressor.decompress(compressed) == chunk
+
+
+@pytest.mark.parametrize(
+    "body,content_type,accept_encoding",
+    [
+        ("x" * 1000, "application/json", ""),
+        ("x" * 1000, "application/json", "gzip;q=0"),
+        ("x" * 1000, "text/plain", "*, gzip;q=0"),
+        ("x" * 10, "application/json", "gzip"),
+        ("x" * 1000, "image/png", "gzip"),
+    ],
+)
+def test_not_compressed(body, content_type, accept_encoding):
+    client = make_client(body, content_type=content_type)
+    response = client.get("/", headers={"Accept-Encoding": accept_encoding})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data().decode() == body
+
+
+@pytest.mark.django_db
+def test_api_compression(test_client, simple_gs):
+    for i in range(10):
+        gs = dict(simple_gs, hwid=f"gs{i}")
+        test_client.put(f"/api/v0/groundstations/{gs['hwid']}/", json=gs)
+
+    response = test_client.get(
+        "/api/v0/groundstations/", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(response.get_data()))) == 10
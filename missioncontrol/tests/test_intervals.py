@@ -0,0 +1,60 @@
+import random
+
+from home.intervals import IntervalIndex, overlapping_groups, overlapping_pairs
+
+
+def test_overlapping_pairs():
+    rng = random.Random(4)
+    intervals = []
+    for i in range(200):
+        start = rng.uniform(0, 1000)
+        intervals.append((start, start + rng.uniform(0, 20), i))
+    intervals.append((10.0, 10.0, "point"))
+    intervals.append((0.0, 10.0, "touching"))
+
+    found = {frozenset((a, b)) for a, b in overlapping_pairs(intervals)}
+    expected = {
+        frozenset((a[2], b[2]))
+        for i, a in enumerate(intervals)
+        for b in intervals[i + 1 :]
+        if a[0] <= b[1] and b[0] <= a[1]
+    }
+    assert found == expected
+    assert frozenset(("point", "touching")) in found
+
+
+def test_overlapping_groups():
+    intervals = [
+        (0, 10, "a"),
+        (5, 6, "b"),
+        (10, 12, "c"),
+        (13, 14, "alone"),
+        (20, 30, "d"),
+        (21, 22, "e"),
+    ]
+    groups = [[item for _, _, item in group] for group in overlapping_groups(intervals)]
+    assert groups == [["a", "b", "c"], ["d", "e"]]
+
+
+def test_interval_index():
+    index = IntervalIndex([(5, 6), (0, 2), (1, 3), (10, 12)])
+    assert (index.starts, index.ends) == ([0, 5, 10], [3, 6, 12])
+    assert list(index.gaps(-5, 20)) == [(-5, 0), (3, 5), (6, 10), (12, 20)]
+    assert list(index.gaps(1, 11)) == [(3, 5), (6, 10)]
+    assert list(index.gaps(7, 8)) == [(7, 8)]
+
+    intervals = [(3, 3), (3.5, 4), (6, 7), (12.5, 13), (-2, -1)]
+    expected = [index.overlaps(start, end) for start, end in intervals]
+    assert expected == [True, False, True, False, False]
+    starts, ends = zip(*intervals)
+    assert index.overlaps_mask(starts, ends).tolist() == expected
+    assert not IntervalIndex([]).overlaps_mask(starts, ends).any()
+
+
+def test_interval_index_add():
+    index = IntervalIndex([])
+    for start, end in [(5, 6), (0, 2), (10, 12), (1, 3), (6, 10), (20, 21)]:
+        index.add(start, end)
+    assert (index.starts, index.ends) == ([0, 5, 20], [3, 12, 21])
+    assert index.overlaps(12, 15)
+    assert not index.overlaps(13, 19)
@@ -14,11 +14,41 @@ from home.leaf import LeafPassFile, LeafOptions
     ],
 )
 def test_boundary_crossing(test_in, test_cmp):
-    def _make_track_from_az_list(az_list):
-        return [{"azimuth": az, "altitude": 1.0, "range": 1000.0} for az in az_list]
-
-    track = _make_track_from_az_list(test_in)
-    expected = _make_track_from_az_list(test_cmp)
+    altitude = [1.0] * len(test_in)
+    _range = [1000.0] * len(test_in)
     lo = LeafOptions()
-    lpf = LeafPassFile(track, lo)
-    assert lpf.track == expected
+    lpf = LeafPassFile(test_in, altitude, _range, lo)
+    assert lpf.azimuth.tolist() == test_cmp
+
+
+def test_from_track():
+    track = [
+        {"azimuth": 358.0, "altitude": 1.0, "range": 1000.0},
+        {"azimuth": 359.0, "altitude": 2.0, "range": 999.0},
+        {"azimuth": 1.0, "altitude": 3.0, "range": 998.0},
+    ]
+    lpf = LeafPassFile.from_track(track, LeafOptions())
+    assert lpf.azimuth.tolist() == [-2.0, -1.0, 1.0]
+    assert lpf.altitude.tolist() == [1.0, 2.0, 3.0]
+    assert lpf.range.tolist() == [1000.0, 999.0, 998.0]
+
+
+def test_altitude_out_of_bounds():
+    with pytest.raises(ValueError):
+        LeafPassFile([1.0, 2.0], [1.0, -0.5], [1000.0, 1000.0], LeafOptions())
+
+
+def test_body_matches_line_template():
+    azimuth = [-0.004, 12.345, 123.456789, 359.995]
+    altitude = [0.0, 5.005, 45.6789, 89.999]
+    _range = [2500.125, 1999.994, 600.5, 412.0]
+    lpf = LeafPassFile(azimuth, altitude, _range, LeafOptions())
+
+    header = lpf.header.splitlines()
+    body = [
+        LeafPassFile.line_template.format(azimuth=az, altitude=alt, range=r)
+        for az, alt, r in zip(lpf.azimuth, altitude, _range)
+    ]
+    expected = "\r\n".join(header + body)
+    assert repr(lpf) == expected
+    assert bytes(lpf) == expected.encode()
@@ -2,11 +2,20 @@ import json
 import pytest
 import uuid
 
+from io import StringIO
+from urllib.parse import urlsplit
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from home.models import Satellite, Pass
+from connexion.exceptions import ProblemException
+from home.models import Satellite, GroundStation, Pass
+from v0.pagination import encode_cursor
+from v0.passes import search_queryset
+from v0.time import utc
 from utils import concurrent_test
-import api
 
 
 @pytest.mark.django_db
@@ -59,7 +68,7 @@ def test_pass_create_from_times(test_client, simple_sat, simple_gs, some_uuid):
 
     # get collection
     response = test_client.get(
-        f"/api/v0/passes/",
+        "/api/v0/passes/",
         query_string={"range_start": _pass["start_time"]},
         headers=headers,
     )
@@ -276,7 +285,7 @@ def test_pass_create_and_get_track(test_client, simple_sat, simple_gs, some_uuid
         "range_end": "2018-12-04T21:46:00Z",
     }
     response = test_client.get(
-        f"/api/v0/accesses/", headers=headers, query_string=params
+        "/api/v0/accesses/", headers=headers, query_string=params
     )
     access = response.json[0]
 
@@ -349,7 +358,7 @@ def test_pass_create_and_list_stale(test_client, simple_sat, simple_gs, some_uui
 
     # check that we don't get back stale pass
     response = test_client.get(
-        f"/api/v0/passes/",
+        "/api/v0/passes/",
         query_string={"range_start": _pass["start_time"]},
         headers=headers,
     )
@@ -358,7 +367,7 @@ def test_pass_create_and_list_stale(test_client, simple_sat, simple_gs, some_uui
 
     # check that we get back stale with show_stale
     response = test_client.get(
-        f"/api/v0/passes/",
+        "/api/v0/passes/",
         query_string={"show_stale": True, "range_start": _pass["start_time"]},
         headers=headers,
     )
@@ -442,3 +451,455 @@ def test_pass_concurrent_conflict(new_test_client, simple_sat, simple_gs):
     # Only one pass should be added, as the other should
     # conflict
     assert Pass.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_pass_conflict_enforced_by_database(
+    created_assets, test_client, simple_sat, simple_gs, some_uuid, monkeypatch
+):
+    headers = {"content-type": "application/json"}
+    _pass = {
+        "satellite": simple_sat["hwid"],
+        "groundstation": simple_gs["hwid"],
+        "start_time": "2018-11-25T00:00:00Z",
+        "end_time": "2018-11-25T01:00:00Z",
+    }
+    response = test_client.put(
+        f"/api/v0/passes/{some_uuid}/", headers=headers, data=json.dumps(_pass)
+    )
+    assert response.status_code == 201
+
+    # as if another pass was saved between the check and the write
+    monkeypatch.setattr(Pass, "conflicts", lambda self: Pass.objects.none())
+    sat = Satellite.objects.get(hwid=simple_sat["hwid"])
+    gs = GroundStation.objects.get(hwid=simple_gs["hwid"])
+
+    def new_pass(start_time, end_time):
+        return Pass.from_times(sat, gs, utc(start_time), utc(end_time))
+
+    # covers the pass, and starts within the reset time after it
+    for start_time, end_time in [
+        ("2018-11-24T23:00:00Z", "2018-11-25T02:00:00Z"),
+        ("2018-11-25T01:01:00Z", "2018-11-25T01:30:00Z"),
+    ]:
+        with pytest.raises(ProblemException) as excinfo:
+            new_pass(start_time, end_time).save()
+        assert excinfo.value.status == 409
+
+    # after the reset time, or stale
+    new_pass("2018-11-25T01:02:00Z", "2018-11-25T01:30:00Z").save()
+    stale = new_pass("2018-11-25T00:30:00Z", "2018-11-25T01:30:00Z")
+    stale.is_desired = False
+    stale.save()
+    assert Pass.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_pass_conflict_check_only_on_scheduling_changes(
+    created_assets, test_client, simple_sat, simple_gs, some_uuid, monkeypatch
+):
+    headers = {"content-type": "application/json"}
+    _pass = {
+        "satellite": simple_sat["hwid"],
+        "groundstation": simple_gs["hwid"],
+        "start_time": "2018-11-25T00:00:00Z",
+        "end_time": "2018-11-25T01:00:00Z",
+    }
+    url = f"/api/v0/passes/{some_uuid}/"
+    response = test_client.put(url, headers=headers, data=json.dumps(_pass))
+    assert response.status_code == 201
+
+    checked = []
+    conflicts = Pass.conflicts
+
+    def counted_conflicts(self):
+        checked.append(self.uuid)
+        return conflicts(self)
+
+    monkeypatch.setattr(Pass, "conflicts", counted_conflicts)
+
+    for method, path, body in [
+        ("put", "attributes/", {"test": "value"}),
+        ("patch", "attributes/", {"test2": "also here"}),
+        ("patch", "", {"external_id": "elsewhere"}),
+        ("put", "", _pass),
+        ("put", "task-stack/", {"tasks": ["ping"]}),
+    ]:
+        response = test_client.open(
+            url + path, method=method, headers=headers, data=json.dumps(body)
+        )
+        assert response.status_code in (200, 201), response.json
+    assert checked == []
+
+    patch = {"end_time": "2018-11-25T01:10:00Z"}
+    response = test_client.patch(url, headers=headers, data=json.dumps(patch))
+    assert response.status_code == 200
+    assert len(checked) == 1
+    _pass = Pass.objects.get(uuid=some_uuid)
+    assert _pass.time_range.upper == utc(patch["end_time"])
+
+
+@pytest.mark.django_db
+def test_pass_create_from_accesses(created_assets, test_client, simple_sat, simple_gs):
+    headers = {"content-type": "application/json"}
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-26T00:00:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    accesses = response.json
+    assert len(accesses) > 1
+    access_ids = [access["id"] for access in accesses]
+
+    response = test_client.post(
+        "/api/v0/accesses/resolve/",
+        headers=headers,
+        data=json.dumps({"access_ids": access_ids[::-1]}),
+    )
+    assert response.status_code == 200
+    assert response.json == accesses[::-1]
+
+    response = test_client.post(
+        "/api/v0/accesses/resolve/",
+        headers=headers,
+        data=json.dumps({"access_ids": access_ids + ["AAAAAAAAAAAAAAAAAAAA"]}),
+    )
+    assert response.status_code == 404
+
+    # the bad id means none of the passes are created
+    response = test_client.post(
+        "/api/v0/passes/from-accesses/",
+        headers=headers,
+        data=json.dumps({"access_ids": access_ids + ["AAAAAAAAAAAAAAAAAAAA"]}),
+    )
+    assert response.status_code == 404
+    assert Pass.objects.count() == 0
+
+    with CaptureQueriesContext(connection) as queries:
+        response = test_client.post(
+            "/api/v0/passes/from-accesses/",
+            headers=headers,
+            data=json.dumps({"access_ids": access_ids}),
+        )
+    assert response.status_code == 201
+    # the passes are written together, like a bulk put
+    inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "home_pass"')]
+    assert len(inserts) == 1
+    assert [p["access_id"] for p in response.json] == access_ids
+    assert [p["start_time"] for p in response.json] == [
+        a["start_time"] for a in accesses
+    ]
+    assert Pass.objects.count() == len(accesses)
+
+    # conflicts roll back the whole batch
+    response = test_client.post(
+        "/api/v0/passes/from-accesses/",
+        headers=headers,
+        data=json.dumps({"access_ids": access_ids}),
+    )
+    assert response.status_code == 409
+    assert Pass.objects.count() == len(accesses)
+
+
+@pytest.mark.django_db
+def test_pass_bulk_put(created_assets, test_client, simple_sat, simple_gs):
+    headers = {"content-type": "application/json"}
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-27T00:00:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    accesses = response.json
+    assert len(accesses) > 2
+    uuids = [str(uuid.uuid4()) for _ in accesses]
+
+    by_id = {"uuid": uuids[0], "access_id": accesses[0]["id"]}
+    by_times = {
+        "uuid": uuids[1],
+        "satellite": simple_sat["hwid"],
+        "groundstation": simple_gs["hwid"],
+        "start_time": accesses[1]["start_time"],
+        "end_time": accesses[1]["end_time"],
+        "external_id": "elsewhere",
+    }
+    response = test_client.put(
+        "/api/v0/passes/", headers=headers, data=json.dumps([by_id, by_times])
+    )
+    assert response.status_code == 200
+    assert [p["uuid"] for p in response.json] == uuids[:2]
+    assert [p["access_id"] for p in response.json] == [a["id"] for a in accesses[:2]]
+    assert response.json[1]["external_id"] == "elsewhere"
+    assert Pass.objects.count() == 2
+
+    # conflicts with the server, and within the batch, save nothing
+    overlapping = {"uuid": uuids[2], "access_id": accesses[1]["id"]}
+    later = {"uuid": uuids[3], "access_id": accesses[2]["id"]}
+    also_later = dict(later, uuid=str(uuid.uuid4()))
+    update = dict(by_id, is_desired=False)
+    response = test_client.put(
+        "/api/v0/passes/",
+        headers=headers,
+        data=json.dumps([update, overlapping, later, also_later]),
+    )
+    assert response.status_code == 409
+    conflicts = {c["uuid"]: c["conflicts"] for c in response.json["conflicts"]}
+    assert set(conflicts) == {uuids[2], uuids[3], also_later["uuid"]}
+    assert [p["uuid"] for p in conflicts[uuids[2]]] == [uuids[1]]
+    assert [p["uuid"] for p in conflicts[uuids[3]]] == [also_later["uuid"]]
+    assert Pass.objects.count() == 2
+    assert Pass.objects.get(uuid=uuids[0]).is_desired
+
+    response = test_client.put(
+        "/api/v0/passes/", headers=headers, data=json.dumps([update, later])
+    )
+    assert response.status_code == 200
+    assert Pass.objects.count() == 3
+    assert not Pass.objects.get(uuid=uuids[0]).is_desired
+    assert Pass.objects.get(uuid=uuids[1]).external_id == "elsewhere"
+
+    response = test_client.put(
+        "/api/v0/passes/",
+        headers=headers,
+        data=json.dumps([dict(by_id, access_id="AAAAAAAAAAAAAAAAAAAA")]),
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_pass_bulk_put_into_old_slot(
+    created_assets, test_client, simple_sat, simple_gs
+):
+    headers = {"content-type": "application/json"}
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-27T00:00:00Z",
+    }
+    accesses = test_client.get("/api/v0/accesses/", query_string=params).json
+    moved = {"uuid": str(uuid.uuid4()), "access_id": accesses[0]["id"]}
+    response = test_client.put(
+        "/api/v0/passes/", headers=headers, data=json.dumps([moved])
+    )
+    assert response.status_code == 200
+
+    # the new pass only conflicts with the moved one until it is written
+    moved["access_id"] = accesses[1]["id"]
+    new = {"uuid": str(uuid.uuid4()), "access_id": accesses[0]["id"]}
+    response = test_client.put(
+        "/api/v0/passes/", headers=headers, data=json.dumps([moved, new])
+    )
+    assert response.status_code == 200
+    assert Pass.objects.get(uuid=moved["uuid"]).access_id == accesses[1]["id"]
+    assert Pass.objects.get(uuid=new["uuid"]).access_id == accesses[0]["id"]
+
+    response = test_client.put(
+        "/api/v0/passes/",
+        headers=headers,
+        data=json.dumps([dict(moved, tle=["1", "2"], is_desried=False)]),
+    )
+    assert response.status_code == 400
+    assert "is_desried, tle" in response.json["detail"]
+
+
+@pytest.mark.django_db
+def test_pass_conflict_report(created_assets, test_client, simple_sat, simple_gs):
+    sat = Satellite.objects.get(hwid=simple_sat["hwid"])
+    gs = GroundStation.objects.get(hwid=simple_gs["hwid"])
+    url = (
+        "/api/v0/passes/conflicts/"
+        "?range_start=2018-11-25T00:00:00Z&range_end=2018-11-26T00:00:00Z"
+    )
+
+    # as if the passes were saved before the database enforced conflicts, the
+    # deferred constraints are never checked, as the test is rolled back
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    first = Pass.from_times(
+        sat, gs, utc("2018-11-25T00:00:00Z"), utc("2018-11-25T01:00:00Z")
+    )
+    first.save()
+    response = test_client.get(url)
+    assert response.status_code == 200
+    assert response.json == []
+
+    second = Pass.from_times(
+        sat, gs, utc("2018-11-25T01:01:00Z"), utc("2018-11-25T01:30:00Z")
+    )
+    second.time_range = second.reset_range()
+    Pass.objects.bulk_create([second])
+
+    response = test_client.get(url)
+    assert response.status_code == 200
+    assert sorted(response.json, key=lambda group: "satellite" in group) == [
+        {
+            "groundstation": simple_gs["hwid"],
+            "start_time": "2018-11-25T00:00:00.000000Z",
+            "end_time": "2018-11-25T01:30:00.000000Z",
+            "passes": [str(first.uuid), str(second.uuid)],
+        },
+        {
+            "satellite": simple_sat["hwid"],
+            "start_time": "2018-11-25T00:00:00.000000Z",
+            "end_time": "2018-11-25T01:30:00.000000Z",
+            "passes": [str(first.uuid), str(second.uuid)],
+        },
+    ]
+
+    response = test_client.get(url + f"&groundstations={simple_gs['hwid']}")
+    assert [group.get("groundstation") for group in response.json] == [
+        simple_gs["hwid"]
+    ]
+
+    out = StringIO()
+    with pytest.raises(CommandError, match="Found 2 groups"):
+        call_command("pass_conflicts", stdout=out)
+    assert f"{simple_gs['hwid']} 2018-11-25 00:00:00+00:00" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_pass_free_windows(create_assets, test_client, simple_sat, simple_gs):
+    north_gs = dict(simple_gs, hwid="northbase", latitude=50.0)
+    create_assets(
+        ("satellite", simple_sat),
+        ("groundstation", simple_gs),
+        ("groundstation", north_gs),
+    )
+    sat = Satellite.objects.get(hwid=simple_sat["hwid"])
+    gs = GroundStation.objects.get(hwid=simple_gs["hwid"])
+    for start_time, end_time, is_desired in [
+        ("2018-11-25T01:00:00Z", "2018-11-25T02:00:00Z", True),
+        ("2018-11-25T03:00:00Z", "2018-11-25T04:00:00Z", True),
+        ("2018-11-25T05:00:00Z", "2018-11-25T06:00:00Z", False),
+    ]:
+        _pass = Pass.from_times(sat, gs, utc(start_time), utc(end_time))
+        _pass.is_desired = is_desired
+        _pass.save()
+
+    response = test_client.get(
+        "/api/v0/passes/free-windows/",
+        query_string={
+            "range_start": "2018-11-25T00:00:00Z",
+            "range_end": "2018-11-25T12:00:00Z",
+        },
+    )
+    assert response.status_code == 200
+    assert response.json == [
+        {
+            "groundstation": simple_gs["hwid"],
+            "start_time": "2018-11-25T00:00:00.000000Z",
+            "end_time": "2018-11-25T00:58:30.000000Z",
+        },
+        {
+            "groundstation": simple_gs["hwid"],
+            "start_time": "2018-11-25T02:01:30.000000Z",
+            "end_time": "2018-11-25T02:58:30.000000Z",
+        },
+        {
+            "groundstation": simple_gs["hwid"],
+            "start_time": "2018-11-25T04:01:30.000000Z",
+            "end_time": "2018-11-25T12:00:00.000000Z",
+        },
+        {
+            "groundstation": "northbase",
+            "start_time": "2018-11-25T00:00:00.000000Z",
+            "end_time": "2018-11-25T12:00:00.000000Z",
+        },
+    ]
+
+    response = test_client.get(
+        "/api/v0/passes/free-windows/",
+        query_string={
+            "range_start": "2018-11-25T01:30:00Z",
+            "range_end": "2018-11-25T03:30:00Z",
+            "groundstations": simple_gs["hwid"],
+        },
+    )
+    assert [(w["start_time"], w["end_time"]) for w in response.json] == [
+        ("2018-11-25T02:01:30.000000Z", "2018-11-25T02:58:30.000000Z")
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("order_by", ["start_time", "-start_time"])
+def test_pass_search_pagination(
+    created_assets, test_client, simple_sat, simple_gs, order_by
+):
+    sat = Satellite.objects.get(hwid=simple_sat["hwid"])
+    gs = GroundStation.objects.get(hwid=simple_gs["hwid"])
+    # stale passes can overlap, some start at the same time
+    for start_time in ["01:00", "02:00", "02:00", "02:00", "03:00", "04:00", "05:00"]:
+        _pass = Pass.from_times(
+            sat,
+            gs,
+            utc(f"2018-11-25T{start_time}:00Z"),
+            utc("2018-11-25T06:00:00Z"),
+        )
+        _pass.is_desired = False
+        _pass.save()
+
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-26T00:00:00Z",
+        "show_stale": True,
+        "order_by": order_by,
+    }
+    response = test_client.get("/api/v0/passes/", query_string=params)
+    assert response.status_code == 200
+    assert "Link" not in response.headers
+    expected = response.json
+    assert len(expected) == 7
+    keys = [(p["start_time"], p["uuid"]) for p in expected]
+    assert keys == sorted(keys, reverse=order_by.startswith("-"))
+
+    pages = []
+    response = test_client.get("/api/v0/passes/", query_string=dict(params, limit=2))
+    while True:
+        assert response.status_code == 200
+        pages.append(response.json)
+        link = response.headers.get("Link")
+        if link is None:
+            break
+        url = urlsplit(link.split(";")[0].strip("<>"))
+        response = test_client.get(f"{url.path}?{url.query}")
+
+    assert [p for page in pages for p in page] == expected
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+
+
+@pytest.mark.django_db
+def test_pass_search_bad_cursor(test_client):
+    for cursor in ["nope", "WyJub3BlIiwibm9wZSJd"]:
+        response = test_client.get("/api/v0/passes/", query_string={"cursor": cursor})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("order_by,keyset", [("start_time", ">"), ("-start_time", "<")])
+def test_pass_search_uses_indexes(test_client, order_by, keyset):
+    # the filters and ordering that the indexes of migration 0024 are there
+    # for, see the explain_pass_search command
+    params = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-26T00:00:00Z",
+        "groundstations": "gs3",
+        "order_by": order_by,
+        "cursor": encode_cursor(["2018-11-25T01:00:00.000000Z", str(uuid.uuid4())]),
+    }
+    with CaptureQueriesContext(connection) as queries:
+        response = test_client.get("/api/v0/passes/", query_string=params)
+    assert response.status_code == 200
+    [sql] = [q["sql"] for q in queries if 'FROM "home_pass"' in q["sql"]]
+
+    direction = "DESC" if order_by.startswith("-") else "ASC"
+    assert '"home_pass"."time_range" && ' in sql
+    assert '"home_pass"."groundstation_id" IN (' in sql
+    assert f'"home_pass"."start_time" {keyset}= ' in sql
+    assert f'"home_pass"."uuid" {keyset} ' in sql
+    order = f'"home_pass"."start_time" {direction}, "home_pass"."uuid" {direction}'
+    assert f"ORDER BY {order}" in sql
+    assert sql.endswith("LIMIT 101")
+
+    # the range filters on start_time only when the range starts on it
+    passes = search_queryset(
+        utc(params["range_start"]), utc(params["range_end"]), range_inclusive="end"
+    )
+    assert "&&" not in str(passes.query)
@@ -0,0 +1,119 @@
+import json
+import pytest
+import numpy as np
+
+from datetime import timedelta
+
+from home.models import GS_RESET_TIME_S, Pass
+from home.scheduler import schedule_rows
+from v0.accesses import ACCESS_DTYPE
+from v0.time import utc
+
+
+def _conflicting(accesses):
+    reset = timedelta(seconds=GS_RESET_TIME_S)
+    for i, a in enumerate(accesses):
+        for b in accesses[i + 1 :]:
+            same_asset = (
+                a["satellite"] == b["satellite"]
+                or a["groundstation"] == b["groundstation"]
+            )
+            if (
+                same_asset
+                and utc(a["start_time"]) - reset <= utc(b["end_time"])
+                and utc(b["start_time"]) - reset <= utc(a["end_time"])
+            ):
+                yield a, b
+
+
+def test_schedule_rows():
+    rows = np.array(
+        [
+            (0, 0, 0.0, 100.0, 10.0),
+            # overlaps the first on the satellite, and is longer
+            (0, 1, 50.0, 200.0, 10.0),
+            # within the reset time of the second on the groundstation
+            (1, 1, 200.0 + GS_RESET_TIME_S, 300.0, 10.0),
+            (1, 1, 201.0 + GS_RESET_TIME_S, 300.0, 10.0),
+            (1, 0, 0.0, 10.0, 10.0),
+        ],
+        dtype=ACCESS_DTYPE,
+    )
+    taken = schedule_rows(rows, np.ones(2), np.ones(2))
+    assert taken.tolist() == rows[[1, 3, 4]].tolist()
+
+    # the second groundstation's time is worth less, and the last access is
+    # then within the reset time of the first on its groundstation
+    taken = schedule_rows(rows, np.ones(2), np.array([1.0, 0.5]))
+    assert taken.tolist() == rows[[0, 2]].tolist()
+
+    # nothing on a groundstation with no weight
+    taken = schedule_rows(rows, np.ones(2), np.array([1.0, 0.0]))
+    assert taken.tolist() == rows[[0]].tolist()
+
+
+@pytest.mark.django_db
+def test_schedule(create_assets, test_client, simple_sat, simple_gs):
+    near_gs = dict(simple_gs, hwid="nearbase", latitude=5.0)
+    read_only_gs = dict(simple_gs, hwid="readonly", passes_read_only=True)
+    create_assets(
+        ("satellite", simple_sat),
+        ("groundstation", simple_gs),
+        ("groundstation", near_gs),
+        ("groundstation", read_only_gs),
+    )
+    headers = {"content-type": "application/json"}
+    body = {
+        "range_start": "2018-11-25T00:00:00Z",
+        "range_end": "2018-11-27T00:00:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=dict(body, limit=1000))
+    candidates = [a for a in response.json if a["groundstation"] != "readonly"]
+    assert list(_conflicting(candidates))
+
+    response = test_client.post(
+        "/api/v0/schedule/", headers=headers, data=json.dumps(body)
+    )
+    assert response.status_code == 200
+    scheduled = response.json
+    assert scheduled
+    assert not list(_conflicting(scheduled))
+    assert all(access in candidates for access in scheduled)
+    # every access left out conflicts with one that was scheduled
+    for access in candidates:
+        if access not in scheduled:
+            assert list(_conflicting(scheduled + [access]))
+    assert Pass.objects.count() == 0
+
+    # favour the near groundstation
+    priorities = {"groundstations": {simple_gs["hwid"]: 0.5}}
+    response = test_client.post(
+        "/api/v0/schedule/",
+        headers=headers,
+        data=json.dumps(dict(body, priorities=priorities)),
+    )
+    favoured = response.json
+    assert not list(_conflicting(favoured))
+
+    def near_time(accesses):
+        return sum(
+            (utc(a["end_time"]) - utc(a["start_time"])).total_seconds()
+            for a in accesses
+            if a["groundstation"] == "nearbase"
+        )
+
+    assert near_time(favoured) > near_time(scheduled)
+
+    response = test_client.post(
+        "/api/v0/schedule/commit/", headers=headers, data=json.dumps(body)
+    )
+    assert response.status_code == 201
+    assert [p["access_id"] for p in response.json] == [a["id"] for a in scheduled]
+    assert Pass.objects.count() == len(scheduled)
+
+    # everything is taken
+    response = test_client.post(
+        "/api/v0/schedule/commit/", headers=headers, data=json.dumps(body)
+    )
+    assert response.status_code == 201
+    assert response.json == []
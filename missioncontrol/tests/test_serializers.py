@@ -0,0 +1,60 @@
+import json
+import pytest
+
+from datetime import datetime, timedelta, timezone
+
+from api import CustomJSONEncoder
+from home.models import GroundStation, Pass, Satellite, TaskStack
+from home.serializers import encode_datetime
+from v0.time import utc
+
+
+@pytest.mark.parametrize(
+    "t",
+    [
+        datetime(2018, 11, 25, 1, 2, 3, 123456, tzinfo=timezone.utc),
+        datetime(2018, 11, 25, 1, 2, 3, tzinfo=timezone.utc),
+        datetime(2018, 11, 25, 1, 2, 3),
+    ],
+)
+def test_encode_datetime(t):
+    assert encode_datetime(t) == t.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def test_encode_datetime_converts_to_utc():
+    t = datetime(2018, 11, 25, 3, 2, 3, tzinfo=timezone(timedelta(hours=2)))
+    assert encode_datetime(t) == "2018-11-25T01:02:03.000000Z"
+
+
+@pytest.mark.django_db
+def test_dump_rows_matches_to_dict(
+    created_assets, test_client, simple_sat, simple_gs, simple_task_stack
+):
+    headers = {"content-type": "application/json"}
+    response = test_client.put(
+        f"/api/v0/task-stacks/{simple_task_stack['uuid']}/",
+        headers=headers,
+        data=json.dumps(simple_task_stack),
+    )
+    assert response.status_code == 201
+    sat = Satellite.objects.get(hwid=simple_sat["hwid"])
+    gs = GroundStation.objects.get(hwid=simple_gs["hwid"])
+    sat.task_stack = TaskStack.objects.get(uuid=simple_task_stack["uuid"])
+    sat.save()
+    _pass = Pass.from_times(
+        sat, gs, utc("2018-11-25T00:00:00.5Z"), utc("2018-11-25T01:00:00Z")
+    )
+    _pass.task_stack = sat.task_stack
+    _pass.attributes = {"priority": "1"}
+    _pass.save()
+
+    for model in [Satellite, GroundStation, Pass, TaskStack]:
+        expected = [
+            json.loads(json.dumps(obj.to_dict(), cls=CustomJSONEncoder))
+            for obj in model.objects.all()
+        ]
+        dumped = model.serializer().dump_rows(model.objects.all())
+        assert dumped == expected
+        assert json.loads(json.dumps(dumped)) == dumped
+
+    assert "time_range" not in Pass.serializer().dump(_pass)
@@ -1,11 +1,21 @@
-import json
 import pytest
 import datetime
 import pytz
-from skyfield.api import Loader
-from django.conf import settings
 
-from v0.time import utc
+from dateutil.parser import parse
+import numpy as np
+from v0.accesses import make_timeseries
+from v0.time import (
+    add_seconds,
+    from_tai_seconds,
+    parse_iso,
+    seconds_between,
+    tai_seconds,
+    tt,
+    tt_iso,
+    tt_midpoint,
+    utc,
+)
 
 
 def test_bad_datetime():
@@ -19,3 +29,66 @@ def test_bad_datetime():
 def test_bad_isostring():
     with pytest.raises(ValueError):
         d = utc("2018-05-23T00:00:00+13:00")
+
+
+@pytest.mark.parametrize(
+    "isostring",
+    [
+        "2018-05-23T01:02:03.123456Z",
+        "2018-05-23T01:02:03.1Z",
+        "2018-05-23T01:02:03Z",
+        "2018-05-23T01:02:03+00:00",
+        "2018-05-23 01:02:03.000007",
+    ],
+)
+def test_fast_isostring(isostring):
+    assert parse_iso(isostring) is not None
+    expected = parse(isostring)
+    if expected.tzinfo is None:
+        expected = expected.replace(tzinfo=pytz.UTC)
+    assert utc(isostring) == expected
+    assert tt_iso(isostring) == expected.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    assert tt_iso(utc(isostring)) == tt_iso(isostring)
+
+
+def test_slow_isostring():
+    assert parse_iso("23 May 2018 01:02:03Z") is None
+    assert tt_iso("23 May 2018 01:02:03Z") == "2018-05-23T01:02:03.000000Z"
+
+
+def test_tt_keeps_microseconds():
+    t = tt("2016-12-31T23:59:60.999999Z")
+    assert t.utc_iso(places=6) == "2016-12-31T23:59:60.999999Z"
+    seconds = tai_seconds(t)
+    assert tt_iso(from_tai_seconds(seconds)) == "2016-12-31T23:59:60.999999Z"
+
+
+def test_add_seconds_over_leap_second():
+    t = tt("2016-12-31T23:59:59.5Z")
+    assert add_seconds(t, 1).utc_iso(places=1) == "2016-12-31T23:59:60.5Z"
+    assert add_seconds(t, 2).utc_iso(places=1) == "2017-01-01T00:00:00.5Z"
+    assert add_seconds(t, -86400).utc_iso(places=1) == "2016-12-30T23:59:59.5Z"
+    assert seconds_between(t, add_seconds(t, 2)) == pytest.approx(2, abs=1e-9)
+
+    times = add_seconds(t, np.arange(4) * 0.5)
+    assert times.utc_iso(places=1) == [
+        "2016-12-31T23:59:59.5Z",
+        "2016-12-31T23:59:60.0Z",
+        "2016-12-31T23:59:60.5Z",
+        "2017-01-01T00:00:00.0Z",
+    ]
+
+    # three seconds, counting the leap second
+    midpoint = tt_midpoint("2016-12-31T23:59:59Z", "2017-01-01T00:00:01Z")
+    assert midpoint.utc_iso(places=1) == "2016-12-31T23:59:60.5Z"
+
+
+def test_make_timeseries():
+    start = tt("2018-05-23T01:02:03.123456Z")
+    end = add_seconds(start, 10)
+    times = make_timeseries(start, end, 3)
+    assert [round(seconds_between(start, t), 6) for t in times] == [0, 3, 6, 9, 12]
+    assert times[0].utc_iso(places=6) == "2018-05-23T01:02:03.123456Z"
+    assert len(make_timeseries(start, end, 4)) == 4
+    with pytest.raises(RuntimeError):
+        make_timeseries(end, start, 1)
@@ -0,0 +1,130 @@
+import gzip
+import json
+import numpy as np
+import pytest
+
+from v0.time import tai_jd, tai_seconds, tt, utc
+from v0.track import packed_track, simplify_track, PACKED_TRACK_HEADER
+
+
+def _max_error(t, values, keep):
+    return np.max(np.abs(np.interp(t, t[keep], values[keep]) - values))
+
+
+def test_simplify_straight_line():
+    t = np.arange(100.0)
+    keep = simplify_track(t, t * 0.5, t * 0.25, 0.01)
+    assert keep.tolist() == [True] + [False] * 98 + [True]
+
+
+def test_simplify_within_tolerance():
+    t = np.linspace(0, 600, 12001)
+    altitude = 60 * np.sin(np.pi * t / 600)
+    azimuth = (100 + 0.5 * t) % 360
+    keep = simplify_track(t, altitude, azimuth, 0.1)
+
+    assert keep[0] and keep[-1]
+    assert keep.sum() < len(t) / 10
+    assert _max_error(t, altitude, keep) <= 0.1
+    unwrapped = np.degrees(np.unwrap(np.radians(azimuth)))
+    assert _max_error(t, unwrapped, keep) <= 0.1
+
+
+def test_simplify_keeps_peak():
+    t = np.arange(5.0)
+    altitude = np.array([0.0, 0.0, 10.0, 0.0, 0.0])
+    keep = simplify_track(t, altitude, np.zeros(5), 1.0)
+    assert keep.tolist() == [True, True, True, True, True]
+    keep = simplify_track(t, altitude, np.zeros(5), 11.0)
+    assert keep.tolist() == [True, False, False, False, True]
+
+
+@pytest.mark.django_db
+def test_access_track_tolerance(created_assets, test_client, simple_sat, simple_gs):
+    params = {
+        "range_start": "2018-12-04T21:46:00Z",
+        "range_end": "2018-12-04T21:46:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    access_id = response.json[0]["id"]
+
+    response = test_client.get(f"/api/v0/accesses/{access_id}/track/?step=1")
+    assert response.status_code == 200
+    full_track = response.json
+
+    response = test_client.get(
+        f"/api/v0/accesses/{access_id}/track/?step=1&tolerance=0.5"
+    )
+    assert response.status_code == 200
+    track = response.json
+    assert 2 < len(track) < len(full_track) / 5
+    assert track[0] == full_track[0]
+    assert track[-1] == full_track[-1]
+
+    response = test_client.get(f"/api/v0/accesses/{access_id}/track/?tolerance=0")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_access_track_encodings(created_assets, test_client, simple_sat, simple_gs):
+    params = {
+        "range_start": "2018-12-04T21:46:00Z",
+        "range_end": "2018-12-04T21:46:00Z",
+    }
+    response = test_client.get("/api/v0/accesses/", query_string=params)
+    access_id = response.json[0]["id"]
+    url = f"/api/v0/accesses/{access_id}/track/"
+
+    track = test_client.get(url).json
+
+    # the track is streamed, and compressed chunk by chunk
+    response = test_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.is_streamed
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert json.loads(gzip.decompress(response.get_data())) == track
+    response = test_client.get(
+        url,
+        headers={"accept": "application/vnd.leaf+text", "Accept-Encoding": "gzip"},
+    )
+    leaf = test_client.get(url, headers={"accept": "application/vnd.leaf+text"})
+    assert gzip.decompress(response.get_data()) == leaf.get_data()
+    # more lines than fit in one chunk
+    assert leaf.get_data().count(b"\r\n") > 256
+
+    response = test_client.get(url, headers={"accept": "application/vnd.track+json"})
+    assert response.status_code == 200
+    columnar = json.loads(response.get_data())
+    assert columnar["epoch"] == track[0]["time"]
+    assert columnar["offsets"][:2] == [0.0, pytest.approx(5.0)]
+    for key in ["azimuth", "altitude", "range"]:
+        assert columnar[key] == [point[key] for point in track]
+
+    response = test_client.get(url, headers={"accept": "application/vnd.track+binary"})
+    assert response.status_code == 200
+    data = response.get_data()
+    magic, version, header_size, n, epoch = PACKED_TRACK_HEADER.unpack_from(data)
+    assert (magic, version, n) == (b"MCTK", 1, len(track))
+    assert epoch == pytest.approx(tai_seconds(tt(track[0]["time"])), abs=1e-5)
+    offsets = np.frombuffer(data, "<f8", n, header_size)
+    azimuth, altitude, _range = np.frombuffer(
+        data, "<f4", 3 * n, header_size + offsets.nbytes
+    ).reshape(3, n)
+    assert np.allclose(offsets, columnar["offsets"])
+    assert np.allclose(azimuth, columnar["azimuth"])
+    assert np.allclose(altitude, columnar["altitude"])
+    assert np.allclose(_range, columnar["range"])
+
+
+def test_packed_track_across_leap_second():
+    # a leap second was inserted at the end of 2016
+    start = tt("2016-12-31T23:59:58Z")
+    times = tai_jd(start.whole, start.tai_fraction + np.arange(4) / 86400)
+    values = np.zeros(4)
+    data = packed_track(times, values, values, values)
+    _, _, header_size, n, epoch = PACKED_TRACK_HEADER.unpack_from(data)
+    offsets = np.frombuffer(data, "<f8", n, header_size)
+    assert offsets == pytest.approx([0.0, 1.0, 2.0, 3.0])
+    # the epoch and offsets decode to the same instants on both sides
+    assert epoch + offsets == pytest.approx(tai_seconds(times), abs=1e-5)
+    assert utc(times[-1].utc_datetime()) == utc("2017-01-01T00:00:00Z")
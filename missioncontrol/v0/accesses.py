@@ -3,113 +3,111 @@ import base64
 import copy
 import zlib
 import math
+import struct
 import logging
 import hashlib
-import datetime
-
-from astropy.time import Time
-from numpy import ediff1d, arange, vectorize
+import calendar
+
+from numpy import (
+    ediff1d,
+    arange,
+    asarray,
+    argsort,
+    concatenate,
+    degrees,
+    dtype,
+    errstate,
+    flatnonzero,
+    inf,
+    lexsort,
+    ones,
+    where,
+    zeros,
+)
 from scipy import optimize
 from Crypto.Cipher import AES
 from concurrent.futures import ProcessPoolExecutor
-from collections import namedtuple
+from collections import namedtuple, defaultdict
+from functools import lru_cache, partial
 from itertools import product
-from skyfield.api import Loader, Topos, EarthSatellite
-from textwrap import wrap
-from flask import request, Response
+from skyfield.api import Loader
+from flask import request
 from urllib.parse import urljoin
-from django.db import transaction
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.conf import settings
 
-from home.models import GroundStation, Satellite, CachedAccess
-from v0.track import get_track_file, DEF_STEP_S
+from home.intervals import IntervalIndex, busy_intervals
+from home.models import GroundStation, Satellite, CachedAccess, GS_RESET_TIME_S
+from v0.track import get_track_file, simplify_track, DEF_STEP_S
+from v0.pagination import encode_cursor, decode_cursor, next_link
+from v0.time import (
+    DAY_S,
+    TAI_EPOCH_JD,
+    add_seconds,
+    from_tai_seconds,
+    now,
+    seconds_between,
+    tai_jd,
+    tai_seconds,
+    tt,
+    tt_iso,
+    tt_midpoint,
+)
 
 AES_KEY = "bananasinpajamas"
 AES_IV = "banana1orbanana2"  # must be 16 bytes
 
+# v1 access ids: version, then (masked) sat id, gs id, unix time of the
+# midpoint and a checksum of the three
+ACCESS_ID_V1 = 1
+ACCESS_ID_V1_STRUCT = struct.Struct("<BIIIH")
+ACCESS_ID_V1_LENGTH = 20  # base64 chars, legacy ids are always longer
+ACCESS_ID_CACHE_SIZE = 4096
+ACCESS_ID_V1_MASK = AES.new(AES_KEY, AES.MODE_ECB).encrypt(AES_IV)[
+    : ACCESS_ID_V1_STRUCT.size - 1
+]
+
 TWO_DAYS_S = 2 * 24 * 60 * 60
 JD_MIN = 1.0 / 24.0 / 60.0
 JD_SEC = JD_MIN / 60.0
 TAU = 2.0 * math.pi
+EARTH_POLAR_RADIUS_KM = 6356.752
+EARTH_MU_KM3_S2 = 398600.4418
+EARTH_ROTATION_RAD_S = 7.2921159e-5
 
-AltAz = namedtuple("AltAz", ["time", "altitude", "azimuth"])
+# passes shorter than this may be missed by the coarse scan
+MIN_SCAN_STEP_S = 5.0
 
-load = Loader(settings.EPHEM_DIR)
-
-##
-## Note, Accesses uses Skyfield Time, which is stored as 64 bit floats of
-##   Julian time.
-##
-##   This is a trade between performance and precision (required here), and
-##   python native datetimes used by django, and common elsewhere.
-##
-##   Note that Skyfield Time objects have a precision of around 20us.
-##   https://rhodesmill.org/skyfield/time.html#time-precision-is-around-20-1-s
-##
-
-
-def timescale_functions():
-    """skyfield requires a "timescale" object that is used for things like
-    leap seconds. we want to initialize it once, but avoid making it
-    a global variable.
-    This closure exposes two functions that rely on a global timescale,
-    """
-    timescale = load.timescale(builtin=True)
+# the osculating orbit wanders from the mean elements in the TLE, and the
+# geodetic latitudes differ from geocentric ones, so pruning leaves a margin
+PRUNE_MARGIN_KM = 50.0
+PRUNE_MARGIN_DEG = 1.0
 
-    def now():
-        return timescale.now()
+# access result sets are structured arrays with a row per access. sat and gs
+# index into the satellites and groundstations the set was made from, start
+# and end are TAI seconds since TAI_EPOCH_JD.
+ACCESS_DTYPE = dtype(
+    [("sat", "i4"), ("gs", "i4"), ("start", "f8"), ("end", "f8"), ("max_alt", "f8")]
+)
 
-    def add_seconds(t, s):
-        """
-        There's no easier way to add seconds to a Time object :(
-        """
-        return timescale.utc(*map(sum, zip(t.utc, (0, 0, 0, 0, 0, s))))
-
-    def tt(t):
-        """do whatever it takes to make time into skyfield"""
-        if t == "now":
-            return now()
-        if isinstance(t, str):
-            t = timescale.from_astropy(Time(t, format="isot"))
-        if isinstance(t, tuple):
-            t = timescale.utc(*t)
-        if isinstance(t, datetime.datetime):
-            t = timescale.utc(t)
-        return t
-
-    def tt_iso(t):
-        t = tt(t)
-        return t.utc_iso(places=6)
-
-    def tt_midpoint(start_time, end_time):
-        start_time = tt(start_time)
-        end_time = tt(end_time)
-        mid_time = timescale.tai_jd(((start_time.tai + end_time.tai) / 2))
-        return mid_time
-
-    def tai_jd(t):
-        return timescale.tai_jd(t)
-
-    return add_seconds, now, tt, tt_iso, tt_midpoint, tai_jd
+logger = logging.getLogger(__name__)
 
+AltAz = namedtuple("AltAz", ["time", "altitude", "azimuth"])
 
-add_seconds, now, tt, tt_iso, tt_midpoint, tai_jd = timescale_functions()
+load = Loader(settings.EPHEM_DIR)
 
 
 def make_timeseries(start, end, step):
-    """return a list of times from start to end.
-    each step is 'step' seconds after the previous time.
+    """returns an array Time from start to end.
+    each step is 'step' seconds after the previous time, and the last time
+    is the first one after end.
     """
-    if end.tt < start.tt:
+    duration = seconds_between(start, end)
+    if duration < 0:
         raise RuntimeError("end cannot be before start")
 
-    t = start
-    ts = [t]
-    while t.tt <= end.tt:
-        t = add_seconds(t, step)
-        ts += [t]
-    return ts
+    steps = int(math.floor(duration / step)) + 2
+    return add_seconds(start, arange(steps) * step)
 
 
 def get_default_range(range_start=None, range_end=None):
@@ -138,41 +136,186 @@ def filter_range(windows, range_start, range_end, range_inclusive):
     inclusive depending on the direction of the page so as to not get
     duplicate items.
     """
+    range_start, range_end = range_start.tai, range_end.tai
+
     # filter the start of the range
     if range_inclusive in ["end", "neither"]:
-        windows = filter(lambda w: tt(w.start_time).tt >= range_start.tt, windows)
+        windows = filter(lambda w: _start_tai(w) >= range_start, windows)
     else:
-        windows = filter(lambda w: tt(w.end_time).tt >= range_start.tt, windows)
+        windows = filter(lambda w: _end_tai(w) >= range_start, windows)
 
     # filter the end of the range
     if range_inclusive in ["start", "neither"]:
-        windows = filter(lambda w: tt(w.end_time).tt <= range_end.tt, windows)
+        windows = filter(lambda w: _end_tai(w) <= range_end, windows)
     else:
-        windows = filter(lambda w: tt(w.start_time).tt <= range_end.tt, windows)
+        windows = filter(lambda w: _start_tai(w) <= range_end, windows)
 
     return windows
 
 
+def range_mask(rows, range_start, range_end, range_inclusive):
+    """the array version of `filter_range`, for access result sets.
+    returns a boolean mask of the rows that pass.
+    """
+    range_start, range_end = tai_seconds(range_start), tai_seconds(range_end)
+
+    if range_inclusive in ["end", "neither"]:
+        mask = rows["start"] >= range_start
+    else:
+        mask = rows["end"] >= range_start
+
+    if range_inclusive in ["start", "neither"]:
+        mask &= rows["end"] <= range_end
+    else:
+        mask &= rows["start"] <= range_end
+
+    return mask
+
+
+def after_mask(rows, sat_ids, gs_ids, after):
+    """returns a boolean mask of the rows with a sort key after `after`"""
+    start, sat_id, gs_id = after
+    sat_ids, gs_ids = sat_ids[rows["sat"]], gs_ids[rows["gs"]]
+    later = rows["start"] > start
+    same = rows["start"] == start
+    later |= same & (sat_ids > sat_id)
+    later |= same & (sat_ids == sat_id) & (gs_ids > gs_id)
+    return later
+
+
+def free_mask(rows, sats, gss):
+    """returns a boolean mask of the access rows that a pass could be made of
+    without conflicting, those more than GS_RESET_TIME_S away from the passes
+    that aren't stale on their satellite and groundstation.
+    the passes are loaded in one query, over the span of the rows.
+    """
+    mask = ones(len(rows), dtype=bool)
+    if not len(rows):
+        return mask
+    starts = rows["start"] - GS_RESET_TIME_S
+    busy = busy_intervals(
+        from_tai_seconds(starts.min()).utc_datetime(),
+        from_tai_seconds(rows["end"].max()).utc_datetime(),
+        [sat.hwid for sat in sats],
+        [gs.hwid for gs in gss],
+    )
+    if not busy:
+        return mask
+
+    datetimes = [
+        t for intervals in busy.values() for interval in intervals for t in interval
+    ]
+    seconds = iter(
+        tai_seconds(AccessCalculator.timescale.from_datetimes(datetimes)).tolist()
+    )
+    columns = {
+        "satellite": ("sat", {sat.hwid: i for i, sat in enumerate(sats)}),
+        "groundstation": ("gs", {gs.hwid: i for i, gs in enumerate(gss)}),
+    }
+    for (asset_type, hwid), intervals in busy.items():
+        index = IntervalIndex([(next(seconds), next(seconds)) for _ in intervals])
+        column, indexes = columns[asset_type]
+        on_asset = flatnonzero(rows[column] == indexes[hwid])
+        overlaps = index.overlaps_mask(starts[on_asset], rows["end"][on_asset])
+        mask[on_asset[overlaps]] = False
+    return mask
+
+
+def sort_rows(rows, sat_ids, gs_ids):
+    """sorts access rows like `Access.sort_key`, by start time, then satellite
+    and groundstation id
+    """
+    order = lexsort((gs_ids[rows["gs"]], sat_ids[rows["sat"]], rows["start"]))
+    return rows[order]
+
+
+def rows_to_accesses(rows, sats, gss, base_url=""):
+    """builds Access objects, only do this for the rows that are returned"""
+    if not len(rows):
+        return []
+    starts = from_tai_seconds(rows["start"])
+    ends = from_tai_seconds(rows["end"])
+    return [
+        Access(start, end, sats[sat], gss[gs], max_alt, base_url=base_url)
+        for start, end, sat, gs, max_alt in zip(
+            starts,
+            ends,
+            rows["sat"].tolist(),
+            rows["gs"].tolist(),
+            rows["max_alt"].tolist(),
+        )
+    ]
+
+
+def _start_tai(window):
+    if isinstance(window, Access):
+        return window.start_tai
+    return tt(window.start_time).tai
+
+
+def _end_tai(window):
+    if isinstance(window, Access):
+        return window.end_tai
+    return tt(window.end_time).tai
+
+
+def _checksum(fields):
+    return zlib.crc32(struct.pack("<III", *fields)) & 0xFFFF
+
+
+def _xor(data, mask):
+    return bytes(a ^ b for a, b in zip(data, mask))
+
+
 class Access(object):
-    """An Access is when a Groundstation has visibility to a Satellite"""
+    """An Access is when a Groundstation has visibility to a Satellite
+
+    start and end are kept as TAI julian dates (whole and fraction, like
+    skyfield does), Time objects are only made when they are asked for.
+    """
+
+    __slots__ = (
+        "_start_whole",
+        "_start_fraction",
+        "_end_whole",
+        "_end_fraction",
+        "_satellite",
+        "_groundstation",
+        "_max_alt",
+        "_base_url",
+        "_access_id",
+    )
 
     _timescale = load.timescale(builtin=True)
 
     def __init__(self, start_time, end_time, sat, gs, max_alt, base_url=""):
-        self._start_time = tt(start_time)
-        self._end_time = tt(end_time)
+        start_time = tt(start_time)
+        end_time = tt(end_time)
+        self._start_whole = start_time.whole
+        self._start_fraction = start_time.tai_fraction
+        self._end_whole = end_time.whole
+        self._end_fraction = end_time.tai_fraction
         self._satellite = sat
         self._groundstation = gs
         self._max_alt = max_alt
         self._base_url = base_url
+        self._access_id = None
 
     @property
     def start_time(self):
-        return self._start_time
+        return tai_jd(self._start_whole, self._start_fraction)
 
     @property
     def end_time(self):
-        return self._end_time
+        return tai_jd(self._end_whole, self._end_fraction)
+
+    @property
+    def start_tai(self):
+        return self._start_whole + self._start_fraction
+
+    @property
+    def end_tai(self):
+        return self._end_whole + self._end_fraction
 
     def clone(self):
         return copy.copy(self)
@@ -180,19 +323,34 @@ class Access(object):
     def clip(self, start, end):
         """returns a new access, with clipped start and end times"""
         access = self.clone()
-        access._start_time = tai_jd(max(tt(start).tai, access.start_time.tai))
-        access._end_time = tai_jd(min(tt(end).tai, access.end_time.tai))
+        start_tai = tt(start).tai
+        if start_tai > access.start_tai:
+            access._start_whole, access._start_fraction = start_tai, 0.0
+        end_tai = tt(end).tai
+        if end_tai < access.end_tai:
+            access._end_whole, access._end_fraction = end_tai, 0.0
+        access._access_id = None
         return access
 
     @property
     def json(self):
         return json.dumps(self.to_dict(), indent=4)
 
+    @property
+    def sort_key(self):
+        """accesses are ordered by start time (TAI seconds since TAI_EPOCH_JD),
+        then satellite and groundstation. matches `sort_rows`
+        """
+        start = (
+            self._start_whole - TAI_EPOCH_JD
+        ) * DAY_S + self._start_fraction * DAY_S
+        return (start, self._satellite.id, self._groundstation.id)
+
     def __lt__(self, other):
-        return self.start_time.tt < other.start_time.tt
+        return self.start_tai < other.start_tai
 
     def __gt__(self, other):
-        return self.start_time.tt > other.start_time.tt
+        return self.start_tai > other.start_tai
 
     @classmethod
     def from_time(cls, t, sat, gs, base_url=""):
@@ -226,11 +384,24 @@ class Access(object):
         the same (or similar) access.
 
         Uses b64url encoding to avoid the need for urlencoding
-        We encrypt so the keys look visually different for operators
-          TODO there is probably a lighter-weight way that is less secure
+        The ids are masked so the keys look visually different for operators,
+        the mask is fixed so we don't need to create a cipher for every id.
         """
+        mid_time = time.utc_datetime()
+        unix_time = calendar.timegm(mid_time.utctimetuple())
+        # round to the nearest second, like the legacy ids
+        unix_time += mid_time.microsecond >= 500000
+        fields = (sat_id, gs_id, unix_time)
+        packed = ACCESS_ID_V1_STRUCT.pack(ACCESS_ID_V1, *fields, _checksum(fields))
+        masked = _xor(packed[1:], ACCESS_ID_V1_MASK)
+        return base64.urlsafe_b64encode(packed[:1] + masked).decode()
 
-        time_strs = [str(int(t)) for t in time.tai_calendar()]
+    @staticmethod
+    def _encode_legacy_access_id(sat_id, gs_id, time):
+        """
+        The original id format, which is an AES-CFB encrypted string of
+        sat_id|gs_id|yymmddHHMMSS
+        """
         time_str = time.utc_strftime("%y%m%d%H%M%S")
         string = "|".join((str(sat_id), str(gs_id), time_str))
 
@@ -243,11 +414,27 @@ class Access(object):
         return access_id.decode()
 
     @classmethod
+    @lru_cache(maxsize=ACCESS_ID_CACHE_SIZE)
     def decode_access_id(cls, access_id):
         """
         complement to the above encoding algorithm
+        Also decodes legacy ids, as groundstations may still hold them.
+        Recently decoded ids are kept in an LRU.
         """
+        if len(access_id) != ACCESS_ID_V1_LENGTH:
+            return cls._decode_legacy_access_id(access_id)
+
+        packed = base64.urlsafe_b64decode(access_id)
+        packed = packed[:1] + _xor(packed[1:], ACCESS_ID_V1_MASK)
+        version, *fields, checksum = ACCESS_ID_V1_STRUCT.unpack(packed)
+        if version != ACCESS_ID_V1 or checksum != _checksum(fields):
+            raise ValueError(f"{access_id} is not a valid access id")
+        sat_id, gs_id, unix_time = fields
+        days, seconds = divmod(unix_time, 86400)
+        return sat_id, gs_id, tt((1970, 1, 1 + days, 0, 0, seconds))
 
+    @classmethod
+    def _decode_legacy_access_id(cls, access_id):
         def decrypt(ciphertext):
             _crypt = AES.new(AES_KEY, AES.MODE_CFB, AES_IV)
             return _crypt.decrypt(ciphertext)
@@ -255,7 +442,7 @@ class Access(object):
         crypted = base64.urlsafe_b64decode(access_id)
         decoded = decrypt(crypted).decode()
         sat_id, gs_id, time_tuple = decoded.split("|")
-        times = [int(c) for c in wrap(time_tuple, 2)]
+        times = [int(time_tuple[i : i + 2]) for i in range(0, len(time_tuple), 2)]
         # we only use the 2 digit year, so add 2000 back
         times[0] += 2000
         time = tt(tuple(times))
@@ -263,29 +450,115 @@ class Access(object):
 
     @classmethod
     def from_id(cls, access_id, base_url=""):
+        """looks the access up in the access cache, and only solves for it
+        if it hasn't been cached
+        """
         sat_id, gs_id, t = cls.decode_access_id(access_id)
         sat = Satellite.objects.get(id=int(sat_id))
         gs = GroundStation.objects.get(id=int(gs_id))
-        return cls.from_time(t, sat, gs, base_url="")
+        access = CachedAccessCalculator.cached_access_at(t, sat, gs, base_url=base_url)
+        if access is None:
+            access = cls.from_time(t, sat, gs, base_url=base_url)
+        return access
+
+    @classmethod
+    def from_ids(cls, access_ids, base_url=""):
+        """resolves many access ids at once.
+        satellites and groundstations are loaded with one query each, and the
+        accesses are looked up in the access cache in one query. Any day
+        buckets that haven't been cached are computed (and cached) once,
+        rather than solving for each access.
+        returns a dict of access_id: access, ids that could not be resolved
+        are left out.
+        """
+        decoded = {}
+        for access_id in access_ids:
+            try:
+                decoded[access_id] = cls.decode_access_id(access_id)
+            except (ValueError, TypeError, UnicodeDecodeError, struct.error):
+                continue
+
+        sats = Satellite.objects.in_bulk({sat_id for sat_id, _, _ in decoded.values()})
+        gss = GroundStation.objects.in_bulk({gs_id for _, gs_id, _ in decoded.values()})
+        to_resolve = {
+            access_id: (sats[sat_id], gss[gs_id], t)
+            for access_id, (sat_id, gs_id, t) in decoded.items()
+            if sat_id in sats and gs_id in gss
+        }
+
+        accesses = CachedAccessCalculator.cached_accesses_at(
+            to_resolve.values(), base_url=base_url
+        )
+        accesses = dict(zip(to_resolve, accesses))
+        missing = [
+            access_id for access_id, access in accesses.items() if access is None
+        ]
+        if missing:
+            # compute (and cache) the buckets the missing accesses would be in
+            buckets = {}
+            for access_id in missing:
+                sat, gs, t = to_resolve[access_id]
+                tbucket = int(math.floor(t.tai))
+                for b in (tbucket - 1, tbucket):
+                    bucket_hash = CachedAccessCalculator._bucket_hash(sat, gs, b)
+                    buckets[bucket_hash] = (sat, gs, b)
+            CachedAccessCalculator._cache_buckets(buckets)
+            found = CachedAccessCalculator.cached_accesses_at(
+                (to_resolve[access_id] for access_id in missing), base_url=base_url
+            )
+            accesses.update(zip(missing, found))
+
+        for access_id, access in list(accesses.items()):
+            if access is not None:
+                continue
+            # not in the cache, e.g. an access that has been clipped to a day
+            sat, gs, t = to_resolve[access_id]
+            try:
+                accesses[access_id] = cls.from_time(t, sat, gs, base_url=base_url)
+            except ObjectDoesNotExist:
+                del accesses[access_id]
+        return accesses
 
     @property
     def access_id(self):
-        mid_time = tt_midpoint(self.start_time, self.end_time)
-        return self.encode_access_id(
-            self._satellite.id, self._groundstation.id, mid_time
-        )
+        if self._access_id is None:
+            mid_time = tt_midpoint(self.start_time, self.end_time)
+            self._access_id = self.encode_access_id(
+                self._satellite.id, self._groundstation.id, mid_time
+            )
+        return self._access_id
+
+    def track_arrays(self, step=DEF_STEP_S, tolerance=None):
+        """computes the track in one vectorized propagation.
+        returns (times, altitude, azimuth, range) where times is a single
+        array Time, and the rest are arrays in degrees and km
 
-    def iter_track(self, step=DEF_STEP_S):
-        times = make_timeseries(self._start_time, self._end_time, step)
+        if a tolerance (deg) is given, then only the points needed to
+        reconstruct altitude and azimuth within that tolerance are returned
+        """
+        times = make_timeseries(self.start_time, self.end_time, step)
         pair = self._satellite - self._groundstation
-        for t in times:
-            altitude, azimuth, _range = pair.at(t).altaz()
-            yield {
-                "time": tt_iso(t),
-                "azimuth": azimuth.degrees,
-                "altitude": altitude.degrees,
-                "range": _range.km,
-            }
+        altitude, azimuth, _range = pair.at(times).altaz()
+        altitude, azimuth, _range = altitude.degrees, azimuth.degrees, _range.km
+        if tolerance is not None:
+            keep = simplify_track(times.tai, altitude, azimuth, tolerance)
+            times, altitude, azimuth, _range = (
+                times[keep],
+                altitude[keep],
+                azimuth[keep],
+                _range[keep],
+            )
+        return times, altitude, azimuth, _range
+
+    def iter_track(self, step=DEF_STEP_S, tolerance=None):
+        times, altitude, azimuth, _range = self.track_arrays(step, tolerance)
+        for t, alt, az, r in zip(
+            times.utc_iso(places=6),
+            altitude.tolist(),
+            azimuth.tolist(),
+            _range.tolist(),
+        ):
+            yield {"time": t, "azimuth": az, "altitude": alt, "range": r}
 
     @staticmethod
     def _find_boundary(sat, gs, t, step, turn_around_when, stop_when):
@@ -326,6 +599,14 @@ class Access(object):
             return RuntimeError("Initial time must be during a pass")
         return _recurse(t, step, alt, azi)
 
+    @property
+    def duration(self):
+        """length of the access in seconds"""
+        return (
+            (self._end_whole - self._start_whole)
+            + (self._end_fraction - self._start_fraction)
+        ) * DAY_S
+
     @property
     def satellite(self):
         return self._satellite
@@ -412,71 +693,202 @@ def _find_accesses_wrapper(args):
     return _find_accesses(*args)
 
 
-def _find_accesses(sat, gs, start, end, ts):
-    """finds a single timestamp from each access in the provided time
-    window.
+def _pair_can_see(sat, gs, min_elevation=None):
+    """cheap geometric check, from the orbital elements alone, of whether a
+    satellite can ever rise above a groundstation's (lowest) horizon mask,
+    or min_elevation (deg) if that is higher.
+
+    The sub-satellite point never gets further from the equator than the
+    inclination, and a satellite at radius r is only above elevation el for
+    groundstations (at radius r_gs) within the earth central angle
+        lambda = arccos(r_gs / r * cos(el)) - el
+    of it. Using the apogee, the lowest mask and the polar radius makes lambda
+    as large as it can be, so False is a proof there are no accesses.
+    """
+    model = sat._vec.model
+    inclination = math.degrees(model.inclo)
+    if inclination > 90.0:
+        # retrograde orbits reach the same latitudes as 180 - i
+        inclination = 180.0 - inclination
+
+    r_apogee = (1.0 + model.alta) * model.radiusearthkm + PRUNE_MARGIN_KM
+    r_gs = EARTH_POLAR_RADIUS_KM + gs.elevation / 1000.0
+    min_el = min(gs.horizon_mask)
+    if min_elevation is not None:
+        min_el = max(min_el, min_elevation)
+    min_el = math.radians(min_el)
+    cos_lambda = min(1.0, r_gs / r_apogee * math.cos(min_el))
+    coverage = math.degrees(math.acos(cos_lambda) - min_el)
+
+    return abs(gs.latitude) <= inclination + coverage + PRUNE_MARGIN_DEG
+
+
+def _max_ground_speed(sat):
+    """upper bound of the speed of the satellite relative to the ground (km/s),
+    the speed at perigee plus the speed of the rotating frame at apogee
+    """
+    model = sat._vec.model
+    r_perigee = (1.0 + model.altp) * model.radiusearthkm - PRUNE_MARGIN_KM
+    r_apogee = (1.0 + model.alta) * model.radiusearthkm + PRUNE_MARGIN_KM
+    a = model.a * model.radiusearthkm
+    v_perigee = math.sqrt(EARTH_MU_KM3_S2 * (2.0 / r_perigee - 1.0 / a))
+    return v_perigee + EARTH_ROTATION_RAD_S * r_apogee
+
+
+def _highest_altitude(t0, alt0, rng0, t1, alt1, rng1, max_speed):
+    """upper bound of the altitude between two samples, see `_adaptive_scan`"""
+    dt = (t1 - t0) * DAY_S
+    min_range = (rng0 + rng1 - max_speed * dt) / 2.0
+    with errstate(divide="ignore"):
+        rate = where(min_range > 0.0, degrees(max_speed / min_range), inf)
+    return (alt0 + alt1 + rate * dt) / 2.0
+
+
+def _adaptive_scan(evaluate, t_start, t_end, step, min_step, max_speed, min_mask):
+    """samples the pair from t_start to t_end (jd), refining the sampling
+    only where a pass could be.
+
+    The elevation of the satellite can't change faster than
+    max_speed / range (rad/s), and the range can't change faster than
+    max_speed, so between two samples the elevation is at most
+        (alt_0 + alt_1 + rate * dt) / 2
+    Intervals where that is below the lowest horizon mask can't hold any
+    part of a pass, and the rest are halved until they are min_step (s)
+    long. Every pass longer than min_step has a sample above the mask.
+
+    evaluate(t) returns arrays of (altitude above the mask, altitude, range)
+    returns the sorted (times, altitudes above the mask, altitudes, ranges) of
+    all the samples
+    """
+    t = arange(t_start, t_end + step, step)
+    samples = [(t, *evaluate(t))]
+
+    # intervals between consecutive samples, as (left, right) arrays
+    left = tuple(column[:-1] for column in samples[0])
+    right = tuple(column[1:] for column in samples[0])
+    while len(left[0]):
+        (t0, f0, alt0, rng0), (t1, f1, alt1, rng1) = left, right
+        highest = _highest_altitude(t0, alt0, rng0, t1, alt1, rng1, max_speed)
+        in_pass = (f0 > 0.0) & (f1 > 0.0)
+        empty = highest <= min_mask
+        refine = ~(in_pass | empty) & ((t1 - t0) * DAY_S > min_step)
+
+        tm = (t0[refine] + t1[refine]) / 2.0
+        mid = (tm, *evaluate(tm))
+        samples.append(mid)
+
+        left = tuple(concatenate([lo[refine], m]) for lo, m in zip(left, mid))
+        right = tuple(concatenate([m, r[refine]]) for m, r in zip(mid, right))
+
+    samples = [concatenate(column) for column in zip(*samples)]
+    order = argsort(samples[0])
+    return tuple(column[order] for column in samples)
+
+
+def _find_accesses(sat, gs, start, end, ts, min_max_alt=None, min_duration=None):
+    """finds the rising, setting and max altitude of each access that is in
+    the provided time window.
+
+    accesses with a max altitude below min_max_alt (deg), or shorter than
+    min_duration (s) are left out. Those that the coarse samples show can't
+    meet them are dropped before their times are refined. Cached buckets are
+    always computed in full, so this only saves work for
+    `AccessCalculator.calculate_accesses`.
     """
     pair = gs.observe(sat)
+    horizon_mask = asarray(gs.horizon_mask, dtype=float)
+
+    def evaluate(t):
+        """vectorized altitude above the horizon mask, altitude and range"""
+        alt, az, distance = pair.at(ts.tai(jd=t)).altaz()
+        horizon = horizon_mask[az.degrees.astype(int) % 360]
+        return alt.degrees - horizon, alt.degrees, distance.km
 
     def f(t, use_horizonmask=True):
         """function to maximize"""
-
-        def _get_horizon(az_deg):
-            return gs.horizon_mask[int(az_deg)]
-
-        get_horizon = vectorize(_get_horizon)
-
-        t = ts.tai(jd=t)
-        alt, az, distance = pair.at(t).altaz()
+        alt, az, distance = pair.at(ts.tai(jd=t)).altaz()
         if use_horizonmask:
-            horizon = get_horizon(az.degrees)
-            return alt.degrees - horizon
+            return alt.degrees - horizon_mask[int(az.degrees) % 360]
         return alt.degrees
 
-    def minusf(t):
-        """function to minimize"""
-        return -f(t)
-
-    t0 = start.tai
-    orbit_period_per_minute = TAU / sat._vec.model.no
-    orbit_period = orbit_period_per_minute / 24.0 / 60.0
-    step = orbit_period / 6.0
-
-    t = arange(start.tai - step, end.tai + (2 * step), step)
-    deg_above_cutoff = f(t)
-    left_diff = ediff1d(deg_above_cutoff, to_begin=0.0)
-    right_diff = ediff1d(deg_above_cutoff, to_end=0.0)
-    maxima = (left_diff > 0.0) & (right_diff < 0.0)
-
-    def find_highest(t):
+    def find_max_alt(rising, setting):
+        # relative to rising, as the bounded tolerance scales with t
         result = optimize.minimize_scalar(
-            minusf, bracket=[t + step, t, t - step], tol=JD_SEC / t
+            lambda dt: -f(rising + dt, use_horizonmask=False),
+            bounds=(0.0, setting - rising),
+            method="bounded",
+            options={"xatol": JD_SEC / 10.0},
         )
-        return result.x
-
-    t_highest = [find_highest(ti) for ti in t[maxima]]
-    dt_highest = ts.tai(jd=t_highest)
-
-    def find_rising(t):
-        """Provide a moment of maximum altitude as `t`."""
-        rising = optimize.brentq(f, t - 2 * step, t)
-        return rising
-
-    def find_setting(t):
-        """Provide a moment of maximum altitude as `t`."""
-        setting = optimize.brentq(f, t + 2 * step, t)
-        return setting
-
-    passes = [ti for ti in t_highest if f(ti) > 0.0]
+        return f(rising + result.x, use_horizonmask=False)
+
+    def could_qualify(i0, i1):
+        """if the pass between samples i0 and i1 could meet the filters"""
+        if min_duration is not None:
+            longest = (t[i1 + 1] - t[i0 - 1]) * DAY_S
+            if longest < min_duration:
+                return False
+        if min_max_alt is not None:
+            s0, s1 = slice(i0 - 1, i1 + 1), slice(i0, i1 + 2)
+            highest = _highest_altitude(
+                t[s0], alt[s0], rng[s0], t[s1], alt[s1], rng[s1], max_speed
+            )
+            if highest.max() < min_max_alt:
+                return False
+        return True
 
-    dt_passes = ts.tai(jd=passes)
-    max_alts = [f(ti, use_horizonmask=False) for ti in passes]
+    def qualifies(rising, setting, max_alt):
+        if min_duration is not None and (setting - rising) * DAY_S < min_duration:
+            return False
+        return min_max_alt is None or max_alt >= min_max_alt
 
-    t_rising = [find_rising(ti) for ti in passes]
-    dt_rising = ts.tai(jd=t_rising)
+    orbit_period_per_minute = TAU / sat._vec.model.no
+    orbit_period = orbit_period_per_minute / 24.0 / 60.0
+    step = orbit_period / 6.0
+    max_speed = _max_ground_speed(sat)
+
+    t, above, alt, rng = _adaptive_scan(
+        evaluate,
+        start.tai - step,
+        end.tai + step,
+        step,
+        MIN_SCAN_STEP_S,
+        max_speed,
+        horizon_mask.min(),
+    )
 
-    t_setting = [find_setting(ti) for ti in passes]
-    dt_setting = ts.tai(jd=t_setting)
+    # each run of samples above the mask is a pass
+    is_above = above > 0.0
+    edges = ediff1d(is_above.astype(int), to_begin=0, to_end=0)
+    first = flatnonzero(edges[:-1] == 1)
+    last = flatnonzero(edges[1:] == -1)
+    if is_above[0]:
+        # it rose before the start of the window
+        last = last[1:]
+
+    # rising and setting are between the first and last samples above the
+    # mask and their neighbours
+    passes = []
+    for i0, i1 in zip(first, last):
+        if not could_qualify(i0, i1):
+            continue
+        rising = optimize.brentq(f, t[i0 - 1], t[i0])
+        setting = optimize.brentq(f, t[i1], t[i1 + 1])
+        passes += [(rising, setting, find_max_alt(rising, setting))]
+
+    if is_above[-1] and len(first) > len(last):
+        # it hasn't set by the end of the window, so step on until it does
+        rising = optimize.brentq(f, t[first[-1] - 1], t[first[-1]])
+        t_set = t[-1]
+        while f(t_set) > 0.0 and t_set < end.tai + 1.0:
+            t_set += step
+        if f(t_set) <= 0.0:
+            setting = optimize.brentq(f, t_set - step, t_set)
+            passes += [(rising, setting, find_max_alt(rising, setting))]
+
+    passes = [p for p in passes if qualifies(*p)]
+    dt_rising = ts.tai(jd=[rising for rising, _, _ in passes])
+    dt_setting = ts.tai(jd=[setting for _, setting, _ in passes])
+    max_alts = [max_alt for _, _, max_alt in passes]
 
     zipped = zip(dt_rising, dt_setting, max_alts)
     return sat, gs, zipped
@@ -496,6 +908,8 @@ class AccessCalculator(object):
         start_time=None,
         end_time=None,
         filter_func=None,
+        min_max_alt=None,
+        min_duration=None,
     ):
         """calculates all of the access between a given list of satellites
         and groundstations over the range between start_time and end_time.
@@ -505,6 +919,9 @@ class AccessCalculator(object):
 
         filter_func allows you to pass in a function to filter out bad
         accesses.
+
+        accesses with a max altitude below min_max_alt (deg), or shorter than
+        min_duration (s) are dropped before they are refined.
         """
         try:
             base_url = request.url_root
@@ -513,22 +930,54 @@ class AccessCalculator(object):
 
         start_time, end_time = get_default_range(start_time, end_time)
 
-        accesses = []
         pairs = []
-        for sat, gs in product(satellites, groundstations):
-            pairs += [(sat, gs, start_time, end_time, cls.timescale)]
+        indexes = []
+        for (i, sat), (j, gs) in product(
+            enumerate(satellites), enumerate(groundstations)
+        ):
+            if not _pair_can_see(sat, gs, min_max_alt):
+                continue
+            indexes += [(i, j)]
+            pairs += [
+                (
+                    sat,
+                    gs,
+                    start_time,
+                    end_time,
+                    cls.timescale,
+                    min_max_alt,
+                    min_duration,
+                )
+            ]
 
+        rows = []
         with ProcessPoolExecutor() as executor:
-            for sat, gs, access_times in executor.map(_find_accesses_wrapper, pairs):
-                accesses += [
-                    Access(t_start, t_end, sat, gs, max_alt, base_url=base_url)
+            found = executor.map(_find_accesses_wrapper, pairs)
+            for (i, j), (_, _, access_times) in zip(indexes, found):
+                rows += [
+                    (i, j, tai_seconds(t_start), tai_seconds(t_end), max_alt)
                     for t_start, t_end, max_alt in access_times
                 ]
+        rows = asarray(rows, dtype=ACCESS_DTYPE)
+
+        # these may not be saved, so order by position rather than id
+        rows = sort_rows(rows, arange(len(satellites)), arange(len(groundstations)))
+        accesses = rows_to_accesses(rows, satellites, groundstations, base_url)
 
         if filter_func is not None and accesses:
-            accesses = filter(filter_func, accesses)
+            accesses = list(filter(filter_func, accesses))
 
-        return sorted(accesses, key=lambda a: a.start_time.tt)
+        return accesses
+
+
+def _decode_cursor(cursor):
+    """the (start, satellite id, groundstation id) of an access search cursor"""
+    start, sat_id, gs_id = decode_cursor(cursor, 3)
+    is_number = isinstance(start, (int, float)) and not isinstance(start, bool)
+    is_id = [type(i) is int for i in (sat_id, gs_id)]
+    if not (is_number and math.isfinite(start) and all(is_id)):
+        raise ValidationError(f"Invalid cursor: {cursor}")
+    return float(start), sat_id, gs_id
 
 
 def search(
@@ -538,13 +987,18 @@ def search(
     range_inclusive="both",
     satellites=None,
     groundstations=None,
+    cursor=None,
+    min_max_alt=None,
+    min_duration=None,
+    free_only=False,
 ):
-
-    # TODO pagination
-    # This could be done with a next header, where range_start is the end_time
-    # of the last access returned previously, and range_inclusive is set to
-    # 'end' so that we don't return any accesses twice
-
+    """the accesses are ordered by `Access.sort_key`.
+    If there are more than `limit` accesses, a next link is returned with a
+    cursor holding the key of the last access, and the search starts from
+    there.
+    with free_only, only accesses that fit in the free windows of their
+    satellite and groundstation are returned, see `free_mask`.
+    """
     if satellites is None:
         sats = list(Satellite.objects.all())
     else:
@@ -555,19 +1009,43 @@ def search(
     else:
         gss = list(GroundStation.objects.filter(hwid__in=groundstations))
 
-    base_url = request.url_root
-    ac = CachedAccessCalculator(base_url=base_url)
-    timescale = ac.timescale
+    after = None
+    if cursor is not None:
+        after = _decode_cursor(cursor)
+
+    row_filter = None
+    if free_only:
+        row_filter = partial(free_mask, sats=sats, gss=gss)
 
     range_start, range_end = get_default_range(range_start, range_end)
-    accesses = ac.calculate_accesses(
-        sats, gss, start_time=range_start, end_time=range_end, limit=limit
+    # take one more than the page, to know if there is a next page
+    rows = CachedAccessCalculator.search_rows(
+        sats,
+        gss,
+        start_time=range_start,
+        end_time=range_end,
+        limit=limit + 1,
+        range_inclusive=range_inclusive,
+        after=after,
+        min_max_alt=min_max_alt,
+        min_duration=min_duration,
+        row_filter=row_filter,
     )
-    accesses = filter_range(accesses, range_start, range_end, range_inclusive)
 
-    return [
-        access.to_dict() for access in sorted(accesses, key=lambda a: a.start_time.tt)
-    ][:limit]
+    accesses = rows_to_accesses(rows[:limit], sats, gss, base_url=request.url_root)
+    page = [access.to_dict() for access in accesses]
+    if len(rows) <= limit:
+        return page
+
+    # pin the range, so the default range doesn't move between pages
+    last = rows[limit - 1]
+    sort_key = [float(last["start"]), sats[last["sat"]].id, gss[last["gs"]].id]
+    headers = next_link(
+        encode_cursor(sort_key),
+        range_start=tt_iso(range_start),
+        range_end=tt_iso(range_end),
+    )
+    return page, 200, headers
 
 
 def get_access(access_id):
@@ -576,12 +1054,22 @@ def get_access(access_id):
     return access.to_dict()
 
 
-def get_track(access_id, step=DEF_STEP_S):
+def resolve(body):
+    access_ids = body["access_ids"]
+    accesses = Access.from_ids(access_ids, base_url=request.url_root)
+    unresolved = [access_id for access_id in access_ids if access_id not in accesses]
+    if unresolved:
+        raise ObjectDoesNotExist(
+            f"Accesses could not be found for ids: {', '.join(unresolved)}"
+        )
+    return [accesses[access_id].to_dict() for access_id in access_ids]
+
+
+def get_track(access_id, step=DEF_STEP_S, tolerance=None):
     base_url = request.url_root
-    accepts = request.headers.get("accept", "")
     access = Access.from_id(access_id, base_url=base_url)
 
-    return get_track_file(access, step=step)
+    return get_track_file(access, step=step, tolerance=tolerance)
 
 
 class CachedAccessCalculator(AccessCalculator):
@@ -594,16 +1082,15 @@ class CachedAccessCalculator(AccessCalculator):
         return hashlib.md5(to_hash.encode()).hexdigest()
 
     @classmethod
-    def _cached_pair_compute(cls, sat, gs, tbucket):
-        """computes accesses for a given (sat,gs) pair on a given tbucket
-        (julian day), and caches the results.
-        returns cached results if they are available.
+    def _bucket_hash(cls, sat, gs, tbucket):
+        """returns the hash of the cache bucket for a (sat,gs) pair on a given
+        tbucket (julian day)
         """
         start = cls.timescale.tai(jd=int(tbucket))
         end = cls.timescale.tai(jd=int(tbucket) + 1)
 
         tle1, tle2 = sat.tle
-        bucket_hash = (
+        return (
             cls._sat_gs_vector_hash(
                 tle1, tle2, gs.latitude, gs.longitude, gs.elevation, gs.horizon_mask
             )
@@ -613,92 +1100,301 @@ class CachedAccessCalculator(AccessCalculator):
             + str(end)
         )
 
-        cached = CachedAccess.objects.filter(bucket_hash=bucket_hash).exists()
-        if not cached:
-            # compute accesses
-            sat, gs, found = _find_accesses(sat, gs, start, end, cls.timescale)
-            accesses_to_cache = [
-                Access(rising, setting, sat, gs, max_alt)
-                for rising, setting, max_alt in found
-                if start.tai <= rising.tai < end.tai
-            ]
-            if not accesses_to_cache:
-                # create placeholder object to store empty range
-                CachedAccess.objects.update_or_create(
-                    bucket_hash=bucket_hash,
-                    defaults={
-                        "satellite": sat,
-                        "groundstation": gs,
-                        "placeholder": True,
-                    },
+    @classmethod
+    def cached_access_at(cls, t, sat, gs, base_url=""):
+        """returns the cached access between sat and gs that is in view at t,
+        or None if it hasn't been cached.
+        """
+        return cls.cached_accesses_at([(sat, gs, t)], base_url=base_url)[0]
+
+    @classmethod
+    def cached_accesses_at(cls, requests, base_url=""):
+        """looks up the cached accesses that are in view for a list of
+        (sat, gs, t) in a single query.
+        accesses are bucketed by their start time, so each access is in the
+        bucket of t, or in the one before if it started before midnight.
+        returns a list of accesses, with None for those that aren't cached.
+        """
+        requests = list(requests)
+        bucket_hashes = []
+        for sat, gs, t in requests:
+            tbucket = int(math.floor(t.tai))
+            bucket_hashes.append(
+                (
+                    cls._bucket_hash(sat, gs, tbucket),
+                    cls._bucket_hash(sat, gs, tbucket - 1),
                 )
-            for bucket_index, access in enumerate(accesses_to_cache):
-                CachedAccess.objects.update_or_create(
-                    bucket_hash=bucket_hash,
-                    bucket_index=bucket_index,
-                    defaults={
-                        "satellite": sat,
-                        "groundstation": gs,
-                        "start_time": tt_iso(access.start_time),
-                        "end_time": tt_iso(access.end_time),
-                        "max_alt": access.max_alt,
-                        "placeholder": False,
-                    },
+            )
+
+        cached = CachedAccess.objects.filter(
+            bucket_hash__in={h for hashes in bucket_hashes for h in hashes},
+            placeholder=False,
+        )
+        buckets = defaultdict(list)
+        for ca in cached:
+            buckets[ca.bucket_hash].append(ca)
+
+        accesses = []
+        for (sat, gs, t), hashes in zip(requests, bucket_hashes):
+            t_utc = t.utc_datetime()
+            in_view = (
+                ca
+                for bucket_hash in hashes
+                for ca in buckets[bucket_hash]
+                if ca.start_time <= t_utc <= ca.end_time
+            )
+            ca = next(in_view, None)
+            if ca is None:
+                accesses.append(None)
+            else:
+                accesses.append(
+                    ca.to_access(base_url=base_url, satellite=sat, groundstation=gs)
                 )
+        return accesses
+
+    @classmethod
+    def _compute_bucket(cls, sat, gs, tbucket, bucket_hash):
+        """computes accesses for a given (sat,gs) pair on a given tbucket
+        (julian day), and caches them under bucket_hash.
+        """
+        start = cls.timescale.tai(jd=int(tbucket))
+        end = cls.timescale.tai(jd=int(tbucket) + 1)
 
-        cached = CachedAccess.objects.filter(bucket_hash=bucket_hash).all()
+        # compute accesses, unless the pair can never see each other
+        found = []
+        if _pair_can_see(sat, gs):
+            sat, gs, found = _find_accesses(sat, gs, start, end, cls.timescale)
+        accesses_to_cache = [
+            Access(rising, setting, sat, gs, max_alt)
+            for rising, setting, max_alt in found
+            if start.tai <= rising.tai < end.tai
+        ]
+        if not accesses_to_cache:
+            # create placeholder object to store empty range
+            CachedAccess.objects.update_or_create(
+                bucket_hash=bucket_hash,
+                defaults={
+                    "satellite": sat,
+                    "groundstation": gs,
+                    "placeholder": True,
+                },
+            )
+        for bucket_index, access in enumerate(accesses_to_cache):
+            CachedAccess.objects.update_or_create(
+                bucket_hash=bucket_hash,
+                bucket_index=bucket_index,
+                defaults={
+                    "satellite": sat,
+                    "groundstation": gs,
+                    "start_time": tt_iso(access.start_time),
+                    "end_time": tt_iso(access.end_time),
+                    "max_alt": access.max_alt,
+                    "duration": access.duration,
+                    "placeholder": False,
+                },
+            )
+
+    @classmethod
+    def _cache_buckets(cls, buckets):
+        """computes (and caches) the buckets of a dict of
+        bucket_hash: (sat, gs, tbucket) that haven't been cached, checking
+        which are with one query.
+        """
+        cached = set(
+            CachedAccess.objects.filter(bucket_hash__in=list(buckets))
+            .values_list("bucket_hash", flat=True)
+            .distinct()
+        )
+        for bucket_hash, (sat, gs, tbucket) in buckets.items():
+            if bucket_hash not in cached:
+                cls._compute_bucket(sat, gs, tbucket, bucket_hash)
+
+    @classmethod
+    def _bucket_rows(
+        cls, sats, gss, pairs, tbucket, min_max_alt=None, min_duration=None
+    ):
+        """returns the access rows of a tbucket (julian day) for a list of
+        (sat index, gs index) pairs, unsorted.
+        buckets that haven't been cached are computed (and cached) first, and
+        the cached rows of every pair are loaded in one query.
+        """
+        # pairs with the same TLE and location share a bucket
+        by_hash = defaultdict(list)
+        for i, j in pairs:
+            by_hash[cls._bucket_hash(sats[i], gss[j], tbucket)].append((i, j))
+        bucket_hashes = list(by_hash)
+
+        cls._cache_buckets(
+            {
+                bucket_hash: (sats[i], gss[j], tbucket)
+                for bucket_hash, [(i, j), *_] in by_hash.items()
+            }
+        )
 
         # dont' return placeholder windows
-        return [ca.to_access() for ca in cached if not ca.placeholder]
+        cached = CachedAccess.objects.filter(
+            bucket_hash__in=bucket_hashes, placeholder=False
+        )
+        if min_max_alt is not None:
+            cached = cached.filter(max_alt__gte=min_max_alt)
+        if min_duration is not None:
+            cached = cached.filter(duration__gte=min_duration)
+        cached = list(
+            cached.values_list("bucket_hash", "start_time", "end_time", "max_alt")
+        )
+        if not cached:
+            return zeros(0, dtype=ACCESS_DTYPE)
+
+        hashes, starts, ends, max_alts = zip(*cached)
+        starts = tai_seconds(cls.timescale.from_datetimes(starts)).tolist()
+        ends = tai_seconds(cls.timescale.from_datetimes(ends)).tolist()
+        rows = [
+            (i, j, start, end, max_alt)
+            for bucket_hash, start, end, max_alt in zip(hashes, starts, ends, max_alts)
+            for i, j in by_hash[bucket_hash]
+        ]
+        return asarray(rows, dtype=ACCESS_DTYPE)
 
     @classmethod
-    def _chunked_compute(cls, sats, gss, range_start, range_end, limit=100):
-        """breaks up time range into chunks, and computes one chunk at a time"""
+    def _iter_bucket_rows(
+        cls,
+        sats,
+        gss,
+        sat_ids,
+        gs_ids,
+        range_start,
+        range_end,
+        after=None,
+        min_max_alt=None,
+        min_duration=None,
+    ):
+        """lazily yields the access rows of every (sat,gs) pair a day bucket
+        at a time, each sorted with `sort_rows`.
+
+        Accesses in a bucket can't start before the bucket does, so a bucket
+        is only loaded (and computed) once the ones before it have been taken.
+        if `after` is given, the buckets before it are skipped.
+        pairs that can't reach min_max_alt are pruned, see `_pair_can_see`.
+        That check is cheaper than looking up a cached bucket, so they are
+        pruned on every search rather than cached as placeholders. Buckets
+        of the other pairs that have no pass are shown to by the rate bound
+        of `_adaptive_scan`, and cached as placeholders by `_compute_bucket`.
+        """
         bucket_start = int(math.floor(range_start.tai))
         bucket_end = int(math.ceil(range_end.tai))
+        if after is not None:
+            after_bucket = int(TAI_EPOCH_JD) + int(math.floor(after[0] / DAY_S))
+            bucket_start = max(bucket_start, after_bucket)
+
+        pairs = list(product(range(len(sats)), range(len(gss))))
+        visible = [
+            (i, j) for i, j in pairs if _pair_can_see(sats[i], gss[j], min_max_alt)
+        ]
+        if len(visible) < len(pairs):
+            logger.debug(
+                "pruned %d of %d satellite/groundstation pairs that can't see "
+                "each other",
+                len(pairs) - len(visible),
+                len(pairs),
+            )
+        if not visible:
+            return
 
-        accesses = []
         for bucket in range(bucket_start, bucket_end):
-            for sat, gs in product(sats, gss):
-                new = cls._cached_pair_compute(sat, gs, bucket)
-                new = filter(lambda a: a.end_time.tai >= range_start.tai, new)
-                new = filter(lambda a: a.start_time.tai <= range_end.tai, new)
-                accesses += new
-            if len(accesses) > limit:
-                break
-        return accesses
+            rows = cls._bucket_rows(
+                sats,
+                gss,
+                visible,
+                bucket,
+                min_max_alt=min_max_alt,
+                min_duration=min_duration,
+            )
+            yield sort_rows(rows, sat_ids, gs_ids)
 
     @classmethod
-    def calculate_accesses(
+    def iter_rows(
         cls,
         satellites,
         groundstations,
         start_time=None,
         end_time=None,
-        filter_func=None,
-        limit=100,
+        range_inclusive="both",
+        after=None,
+        min_max_alt=None,
+        min_duration=None,
+        row_filter=None,
     ):
-        """calculates all of the access between a given list of satellites
-        and groundstations over the range between start_time and end_time.
+        """lazily yields the access rows (see ACCESS_DTYPE) between a given
+        list of satellites and groundstations over the range between
+        start_time and end_time. rows come in chunks, in sort_key order.
+        Nothing more is computed than is needed for the chunks that are taken.
 
-        If no times are given, then the default propagation window is from
-        "now" until two days from now
+        range_inclusive is applied like `filter_range`, and after is a
+        sort_key, only accesses after it are returned.
 
-        filter_func allows you to pass in a function to filter out bad
-        accesses.
+        accesses with a max altitude below min_max_alt (deg), or shorter than
+        min_duration (s) are left out, and so are the rows that row_filter
+        (a function of rows, returning a boolean mask) leaves out.
         """
-        try:
-            base_url = request.url_root
-        except RuntimeError:
-            base_url = ""
-
+        satellites, groundstations = list(satellites), list(groundstations)
         start_time, end_time = get_default_range(start_time, end_time)
-
-        accesses = cls._chunked_compute(
-            satellites, groundstations, start_time, end_time, limit=limit
+        sat_ids = asarray([sat.id for sat in satellites], dtype="i8")
+        gs_ids = asarray([gs.id for gs in groundstations], dtype="i8")
+
+        chunks = cls._iter_bucket_rows(
+            satellites,
+            groundstations,
+            sat_ids,
+            gs_ids,
+            start_time,
+            end_time,
+            after=after,
+            min_max_alt=min_max_alt,
+            min_duration=min_duration,
         )
+        for rows in chunks:
+            mask = range_mask(rows, start_time, end_time, range_inclusive)
+            if after is not None:
+                mask &= after_mask(rows, sat_ids, gs_ids, after)
+            rows = rows[mask]
+            if row_filter is not None and len(rows):
+                rows = rows[row_filter(rows)]
+            if len(rows):
+                yield rows
 
-        if filter_func is not None and accesses:
-            accesses = filter(filter_func, accesses)
+    @classmethod
+    def search_rows(
+        cls,
+        satellites,
+        groundstations,
+        start_time=None,
+        end_time=None,
+        limit=100,
+        range_inclusive="both",
+        after=None,
+        min_max_alt=None,
+        min_duration=None,
+        row_filter=None,
+    ):
+        """returns the first `limit` access rows, see `iter_rows`"""
+        chunks = []
+        taken = 0
+        for rows in cls.iter_rows(
+            satellites,
+            groundstations,
+            start_time,
+            end_time,
+            range_inclusive=range_inclusive,
+            after=after,
+            min_max_alt=min_max_alt,
+            min_duration=min_duration,
+            row_filter=row_filter,
+        ):
+            chunks += [rows]
+            taken += len(rows)
+            if taken >= limit:
+                break
 
-        return sorted(accesses, key=lambda a: a.start_time.tt)
+        if not chunks:
+            return zeros(0, dtype=ACCESS_DTYPE)
+        return concatenate(chunks)[:limit]
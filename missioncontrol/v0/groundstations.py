@@ -2,7 +2,8 @@ from home.models import GroundStation
 
 
 def search(limit=100):
-    return [gs.to_dict() for gs in GroundStation.objects.all().order_by("hwid")[:limit]]
+    groundstations = GroundStation.objects.all().order_by("hwid")[:limit]
+    return GroundStation.serializer().dump_rows(groundstations)
 
 
 def get_hwid(hwid):
@@ -0,0 +1,36 @@
+import json
+import base64
+import binascii
+
+from urllib.parse import urlencode
+from flask import request
+from django.core.exceptions import ValidationError
+
+
+def encode_cursor(key):
+    """encodes a sort key (a list of json types) into an opaque cursor"""
+    encoded = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(encoded).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length):
+    """complement to `encode_cursor`, checks the key has `length` items"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        key = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError):
+        raise ValidationError(f"Invalid cursor: {cursor}")
+    if not isinstance(key, list) or len(key) != length:
+        raise ValidationError(f"Invalid cursor: {cursor}")
+    return key
+
+
+def next_link(cursor, **params):
+    """returns a Link header pointing at the next page of the current request.
+    the query string is kept, with the cursor (and any params) replaced.
+    """
+    args = request.args.to_dict(flat=False)
+    args.update({key: [str(value)] for key, value in params.items()})
+    args["cursor"] = [cursor]
+    url = request.base_url + "?" + urlencode(args, doseq=True)
+    return {"Link": f'<{url}>; rel="next"'}
@@ -24,6 +24,6 @@ def put(uuid, task_stack):
 
     _pass = Pass.objects.get(uuid=uuid)
     _pass.task_stack = ts_obj
-    _pass.save()
+    _pass.save(update_fields=["task_stack"])
 
     return ts, 201
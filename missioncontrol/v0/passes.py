@@ -1,56 +1,69 @@
-import json
 import datetime
 
-from base64 import b64encode, b64decode
-from collections import namedtuple
 from connexion.exceptions import ProblemException
-from itertools import product
-from skyfield.api import Loader, Topos, EarthSatellite
-from home.leaf import LeafPassFile
-from flask import request, Response
-
-from home.models import GroundStation, Satellite, Pass, TaskStack
+from itertools import chain
+from uuid import UUID, uuid4
+from psycopg2.errorcodes import EXCLUSION_VIOLATION
+from psycopg2.extras import DateTimeTZRange
+
+from home.intervals import conflict_report, find_free_windows, pass_conflicts
+from home.models import (
+    GroundStation,
+    Satellite,
+    Pass,
+    TaskStack,
+    PASS_EXCLUSION_CONSTRAINTS,
+    PASS_NOT_STALE,
+)
+from django.db import connection, transaction, IntegrityError
 from django.db.models import Q
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from v0.accesses import Access
 from v0.track import get_track_file, DEF_STEP_S
-from v0.time import utc
+from v0.pagination import encode_cursor, decode_cursor, next_link
+from v0.time import utc, tt_iso, tt_midpoint
 
 
 TWO_DAYS_S = 2 * 24 * 60 * 60
 
+# a put replaces every field of a pass
+BULK_UPDATE_FIELDS = [
+    f.name for f in Pass._meta.concrete_fields if not f.primary_key and f.name != "uuid"
+]
+# the fields a pass can be put with
+BULK_PUT_FIELDS = {"uuid"} | {
+    f.name for f in Pass._meta.concrete_fields if f.editable and not f.primary_key
+}
 
-def search(
-    limit=100,
-    range_start=None,
-    range_end=None,
+
+def search_queryset(
+    range_start,
+    range_end,
     range_inclusive="both",
     satellites=None,
     groundstations=None,
     order_by="start_time",
     show_stale=False,
+    after=None,
 ):
-
-    if satellites is None:
-        dj_sats = Satellite.objects.all()
-    else:
-        dj_sats = Satellite.objects.filter(hwid__in=satellites)
-
-    if groundstations is None:
-        dj_gss = GroundStation.objects.all()
-    else:
-        dj_gss = GroundStation.objects.filter(hwid__in=groundstations)
-
-    passes = Pass.objects.filter(satellite__in=dj_sats, groundstation__in=dj_gss)
-
-    # set the default time range, if no range is specified
-    if range_start is None and range_end is None:
-        range_start = utc("now")
-        range_end = range_start + datetime.timedelta(days=2)
+    """the passes of a `search`, ordered by order_by, then uuid.
+    after is the (start_time, uuid) of a pass, only the passes after it are
+    returned.
+    the filters are written so that postgres can answer them from the
+    indexes of migration 0024, see the explain_pass_search command.
+    """
+
+    # passes reference satellites and groundstations by hwid, so they can be
+    # filtered on the (satellite, start_time) and (groundstation, start_time)
+    # indexes without a join
+    passes = Pass.objects.all()
+    if satellites is not None:
+        passes = passes.filter(satellite__in=satellites)
+    if groundstations is not None:
+        passes = passes.filter(groundstation__in=groundstations)
 
     # filter the start of the range
     if range_start is not None:
-        range_start = utc(range_start)
         if range_inclusive in ["end", "neither"]:
             passes = passes.filter(start_time__gte=range_start)
         else:
@@ -58,20 +71,124 @@ def search(
 
     # filter the end of the range
     if range_end is not None:
-        range_end = utc(range_end)
         if range_inclusive in ["start", "neither"]:
             passes = passes.filter(end_time__lte=range_end)
         else:
             passes = passes.filter(start_time__lte=range_end)
 
-    if not show_stale:
-        passes = passes.exclude(
-            Q(scheduled_on_gs=False) & Q(scheduled_on_sat=False) & Q(is_desired=False)
+    # start_time has no lower bound when the range starts on end_time, but the
+    # passes in the range have a time_range overlapping it, which
+    # pass_time_range_idx finds without scanning the history
+    if range_start is not None and range_inclusive in ["both", "start"]:
+        passes = passes.filter(
+            time_range__overlap=DateTimeTZRange(range_start, range_end, "[]")
         )
 
-    passes = passes.all().order_by(order_by)[:limit]
+    if not show_stale:
+        # the same condition as the partial index over passes that aren't stale
+        passes = passes.filter(PASS_NOT_STALE)
+
+    if after is not None:
+        start_time, uuid = after
+        # the start_time bound alone is an index range
+        if order_by == "start_time":
+            passes = passes.filter(
+                Q(start_time__gt=start_time) | Q(uuid__gt=uuid),
+                start_time__gte=start_time,
+            )
+        else:
+            passes = passes.filter(
+                Q(start_time__lt=start_time) | Q(uuid__lt=uuid),
+                start_time__lte=start_time,
+            )
+
+    uuid_order = order_by.replace("start_time", "uuid")
+    return passes.order_by(order_by, uuid_order)
+
+
+def search(
+    limit=100,
+    range_start=None,
+    range_end=None,
+    range_inclusive="both",
+    satellites=None,
+    groundstations=None,
+    order_by="start_time",
+    show_stale=False,
+    cursor=None,
+):
+    """passes are ordered by order_by, then uuid.
+    If there are more than `limit` passes, a next link is returned with a
+    cursor holding the (start_time, uuid) of the last pass, and the search
+    continues after it, on the same indexes as the first page.
+    """
+
+    # set the default time range, if no range is specified
+    if range_start is None and range_end is None:
+        range_start = utc("now")
+        range_end = range_start + datetime.timedelta(days=2)
+    if range_start is not None:
+        range_start = utc(range_start)
+    if range_end is not None:
+        range_end = utc(range_end)
+
+    passes = search_queryset(
+        range_start,
+        range_end,
+        range_inclusive=range_inclusive,
+        satellites=satellites,
+        groundstations=groundstations,
+        order_by=order_by,
+        show_stale=show_stale,
+        after=None if cursor is None else _decode_cursor(cursor),
+    )
+
+    # take one more than the page, to know if there is a next page
+    passes = Pass.serializer().dump_rows(passes[: limit + 1])
+
+    page = passes[:limit]
+    if len(passes) <= limit:
+        return page
+
+    # pin the range, so the default range doesn't move between pages
+    last = page[-1]
+    pinned = {"range_start": range_start, "range_end": range_end}
+    headers = next_link(
+        encode_cursor([last["start_time"], last["uuid"]]),
+        **{key: tt_iso(value) for key, value in pinned.items() if value is not None},
+    )
+    return page, 200, headers
+
+
+def _decode_cursor(cursor):
+    """the (start_time, uuid) of a pass search cursor"""
+    start_time, uuid = decode_cursor(cursor, 2)
+    try:
+        return utc(start_time), UUID(uuid)
+    except (TypeError, ValueError, OverflowError):
+        raise ValidationError(f"Invalid cursor: {cursor}")
+
 
-    return [p.to_dict() for p in passes]
+def conflicts(range_start=None, range_end=None, satellites=None, groundstations=None):
+    # set the default time range, if no range is specified
+    if range_start is None and range_end is None:
+        range_start = utc("now")
+        range_end = range_start + datetime.timedelta(days=2)
+    range_start = None if range_start is None else utc(range_start)
+    range_end = None if range_end is None else utc(range_end)
+    return conflict_report(range_start, range_end, satellites, groundstations)
+
+
+def free_windows(range_start=None, range_end=None, groundstations=None):
+    if groundstations is None:
+        groundstations = GroundStation.objects.values_list("hwid", flat=True)
+    groundstations = sorted(groundstations)
+
+    # the range defaults to now->2days, from range_start if it's given
+    range_start = utc("now" if range_start is None else range_start)
+    if range_end is None:
+        range_end = range_start + datetime.timedelta(days=2)
+    return find_free_windows(range_start, utc(range_end), groundstations)
 
 
 def get_pass(uuid):
@@ -113,10 +230,10 @@ def patch(uuid, _pass):
     return pass_obj.to_dict()
 
 
-def get_track(uuid, step=DEF_STEP_S):
+def get_track(uuid, step=DEF_STEP_S, tolerance=None):
     _pass = Pass.objects.get(uuid=uuid)
     access = _pass.access().clip(_pass.start_time, _pass.end_time)
-    return get_track_file(access, step=step)
+    return get_track_file(access, step=step, tolerance=tolerance)
 
 
 def recalculate(uuid):
@@ -174,6 +291,188 @@ def put(uuid, _pass):
     return _pass.to_dict(), status_code
 
 
+def create_from_accesses(body):
+    """creates a pass for each of the access ids, in a single transaction,
+    through `bulk_put`
+    """
+    new_passes = [
+        {
+            "uuid": str(uuid4()),
+            "access_id": access_id,
+            "is_desired": body.get("is_desired", True),
+        }
+        for access_id in body["access_ids"]
+    ]
+    created, _ = bulk_put(new_passes)
+    return created, 201
+
+
+def bulk_put(passes):
+    """creates or updates many passes, like `put` does for one.
+    access ids are resolved all at once, and conflicts are checked for the
+    whole batch at once, with each other and with the passes on the server.
+    If any pass conflicts then none are saved, and the conflicts of each
+    pass are returned.
+    """
+    for _pass in passes:
+        unknown = set(_pass) - BULK_PUT_FIELDS
+        if unknown:
+            raise ValidationError(f"Unknown pass fields: {', '.join(sorted(unknown))}")
+    passes = [dict(_pass, uuid=UUID(_pass["uuid"])) for _pass in passes]
+    uuids = [_pass["uuid"] for _pass in passes]
+    if len(set(uuids)) < len(uuids):
+        raise ValidationError("Pass uuids must be unique")
+
+    by_times = [_pass for _pass in passes if "access_id" not in _pass]
+    sats = Satellite.objects.in_bulk(
+        {_pass["satellite"] for _pass in by_times}, field_name="hwid"
+    )
+    gss = GroundStation.objects.in_bulk(
+        {_pass["groundstation"] for _pass in by_times}, field_name="hwid"
+    )
+    task_stacks = TaskStack.objects.in_bulk(
+        {_pass["task_stack"] for _pass in passes if _pass.get("task_stack")},
+        field_name="uuid",
+    )
+
+    # passes given by times use the access at their midpoint, like
+    # `Access.from_overlap`, so they can be resolved with the access ids
+    access_ids = {}
+    for _pass in passes:
+        if "access_id" in _pass:
+            access_ids[_pass["uuid"]] = _pass["access_id"]
+            continue
+        try:
+            sat = sats[_pass["satellite"]]
+            gs = gss[_pass["groundstation"]]
+        except KeyError as e:
+            raise ObjectDoesNotExist(f"{e.args[0]} does not exist")
+        mid_time = tt_midpoint(_pass["start_time"], _pass["end_time"])
+        access_ids[_pass["uuid"]] = Access.encode_access_id(sat.id, gs.id, mid_time)
+    accesses = Access.from_ids(set(access_ids.values()))
+
+    unresolved = [
+        _pass["access_id"]
+        for _pass in passes
+        if "access_id" in _pass and _pass["access_id"] not in accesses
+    ]
+    if unresolved:
+        raise ObjectDoesNotExist(
+            f"Accesses could not be found for ids: {', '.join(unresolved)}"
+        )
+
+    new_passes = []
+    for _pass in passes:
+        _pass = dict(_pass)
+        access = accesses.get(access_ids[_pass["uuid"]])
+        if "access_id" in _pass:
+            po = Pass.from_access(access)
+            po.start_time = utc(_pass.pop("start_time", access.start_time))
+            po.end_time = utc(_pass.pop("end_time", access.end_time))
+        else:
+            sat = sats[_pass.pop("satellite")]
+            gs = gss[_pass.pop("groundstation")]
+            start_time = utc(_pass.pop("start_time"))
+            end_time = utc(_pass.pop("end_time"))
+            po = Pass.from_times(sat, gs, start_time, end_time)
+            if access is None:
+                po.is_valid = False
+            else:
+                po.access_id = access.access_id
+        _pass.pop("satellite", None)
+        _pass.pop("groundstation", None)
+        _pass.pop("access_id", None)
+
+        task_stack_uuid = _pass.pop("task_stack", None)
+        if task_stack_uuid:
+            try:
+                po.task_stack = task_stacks[UUID(task_stack_uuid)]
+            except KeyError:
+                raise ObjectDoesNotExist(f"{task_stack_uuid} does not exist")
+        for key, value in _pass.items():
+            setattr(po, key, value)
+        # the related objects have already been looked up
+        po.clean_fields(exclude=["satellite", "groundstation", "task_stack"])
+        po.time_range = po.reset_range()
+        new_passes.append(po)
+
+    with transaction.atomic():
+        existing = Pass.objects.select_for_update().in_bulk(uuids, field_name="uuid")
+        to_create, to_update = [], []
+        for po in new_passes:
+            if po.uuid in existing:
+                po.pk = existing[po.uuid].pk
+                po._state.adding = False
+                to_update.append(po)
+            else:
+                to_create.append(po)
+
+        # the passes on the server that could conflict with the batch
+        checked = [po for po in new_passes if not po.is_stale]
+        on_server = Pass.objects.none()
+        if checked:
+            on_server = Pass.objects.filter(
+                PASS_NOT_STALE
+                & (
+                    Q(satellite__in={po.satellite_id for po in checked})
+                    | Q(groundstation__in={po.groundstation_id for po in checked})
+                )
+                & Q(
+                    time_range__overlap=DateTimeTZRange(
+                        min(po.time_range.lower for po in checked),
+                        max(po.time_range.upper for po in checked),
+                        "[]",
+                    )
+                )
+            ).exclude(uuid__in=uuids)
+        on_server = list(on_server)
+
+        by_uuid = {po.uuid: po for po in chain(on_server, new_passes)}
+        conflicts = pass_conflicts(by_uuid.values())
+        reports = [
+            {
+                "uuid": po.uuid,
+                "conflicts": [
+                    by_uuid[uuid].to_dict()
+                    for uuid in sorted(
+                        conflicts[po.uuid], key=lambda uuid: by_uuid[uuid].start_time
+                    )
+                ],
+            }
+            for po in new_passes
+            if conflicts.get(po.uuid)
+        ]
+        if reports:
+            raise ProblemException(
+                status=409,
+                title="Conflict",
+                detail="Some of the provided passes conflict with each other, "
+                "or with passes on the server",
+                ext={"conflicts": reports},
+            )
+
+        # the batch was checked as a whole, but a pass can be moved into the
+        # old slot of another one in the batch, which only conflicts until
+        # both rows are written, so the constraints are checked at the end
+        constraints = ", ".join(PASS_EXCLUSION_CONSTRAINTS)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SET CONSTRAINTS {constraints} DEFERRED")
+                Pass.objects.bulk_create(to_create)
+                Pass.objects.bulk_update(to_update, BULK_UPDATE_FIELDS)
+                cursor.execute(f"SET CONSTRAINTS {constraints} IMMEDIATE")
+        except IntegrityError as e:
+            if getattr(e.__cause__, "pgcode", None) != EXCLUSION_VIOLATION:
+                raise
+            raise ProblemException(
+                status=409,
+                title="Conflict",
+                detail="A conflicting pass was saved at the same time, try again",
+            )
+
+    return [po.to_dict() for po in new_passes], 200
+
+
 def get_attributes(uuid):
     _pass = Pass.objects.get(uuid=uuid)
     return _pass.attributes or {}
@@ -185,12 +484,12 @@ def patch_attributes(uuid, attributes):
         _pass.attributes.update(attributes)
     else:
         _pass.attributes = attributes
-    _pass.save()
+    _pass.save(update_fields=["attributes"])
     return _pass.attributes or {}
 
 
 def put_attributes(uuid, attributes):
     _pass = Pass.objects.get(uuid=uuid)
     _pass.attributes = attributes
-    _pass.save()
+    _pass.save(update_fields=["attributes"])
     return _pass.attributes or {}
@@ -2,7 +2,8 @@ from home.models import Satellite
 
 
 def search(limit=100):
-    return [sat.to_dict() for sat in Satellite.objects.all().order_by("hwid")[:limit]]
+    satellites = Satellite.objects.all().order_by("hwid")[:limit]
+    return Satellite.serializer().dump_rows(satellites)
 
 
 def get_hwid(hwid):
@@ -0,0 +1,58 @@
+from uuid import uuid4
+
+from flask import request
+
+from home.models import GroundStation, Satellite
+from home.scheduler import schedule
+from v0.accesses import get_default_range
+from v0 import passes
+
+
+def _schedule(body, base_url=""):
+    satellites = body.get("satellites")
+    groundstations = body.get("groundstations")
+    if satellites is None:
+        sats = Satellite.objects.all()
+    else:
+        sats = Satellite.objects.filter(hwid__in=satellites)
+    if groundstations is None:
+        gss = GroundStation.objects.all()
+    else:
+        gss = GroundStation.objects.filter(hwid__in=groundstations)
+
+    range_start, range_end = get_default_range(
+        body.get("range_start"), body.get("range_end")
+    )
+    return schedule(
+        sats.order_by("id"),
+        gss.order_by("id"),
+        range_start,
+        range_end,
+        priorities=body.get("priorities"),
+        min_max_alt=body.get("min_max_alt"),
+        min_duration=body.get("min_duration"),
+        base_url=base_url,
+    )
+
+
+def dry_run(body):
+    """the accesses that would be scheduled, nothing is saved"""
+    return [access.to_dict() for access in _schedule(body, request.url_root)]
+
+
+def commit(body):
+    """schedules the accesses, and creates their passes like
+    `passes.bulk_put` in a single transaction
+    """
+    new_passes = [
+        {
+            "uuid": str(uuid4()),
+            "access_id": access.access_id,
+            "is_desired": body.get("is_desired", True),
+        }
+        for access in _schedule(body)
+    ]
+    if not new_passes:
+        return [], 201
+    created, _ = passes.bulk_put(new_passes)
+    return created, 201
@@ -16,7 +16,7 @@ def search(environment=None, name=None, limit=100):
     if name is not None:
         qs = qs.filter(name__icontains=name)
 
-    return [ts.to_dict() for ts in qs.all()[:limit]]
+    return TaskStack.serializer().dump_rows(qs.all()[:limit])
 
 
 def put(uuid, task_stack):
@@ -1,9 +1,38 @@
-from copy import copy
+import re
 from datetime import datetime
 from pytz import UTC
 from dateutil.parser import parse
-from dateutil.tz import tzutc
-from skyfield.api import Time
+from skyfield.api import Loader, Time
+from django.conf import settings
+
+# Note, Accesses uses Skyfield Time, which is stored as 64 bit floats of
+#   Julian time.
+#
+#   This is a trade between performance and precision (required here), and
+#   python native datetimes used by django, and common elsewhere.
+#
+#   Note that Skyfield Time objects have a precision of around 20us.
+#   https://rhodesmill.org/skyfield/time.html#time-precision-is-around-20-1-s
+
+DAY_S = 24 * 60 * 60
+TAI_EPOCH_JD = 2451545.0
+
+# the ISO 8601 UTC formats the api emits, e.g. 2018-05-23T01:02:03.123456Z
+# these are parsed directly, anything else goes through dateutil
+ISO_UTC_RE = re.compile(
+    r"(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?(?:Z|[+-]00:?00)?"
+)
+
+
+def parse_iso(t):
+    """returns (year, month, day, hour, minute, second, microsecond) of an
+    ISO 8601 UTC string, or None if it isn't in one of the formats we emit
+    """
+    match = ISO_UTC_RE.fullmatch(t)
+    if match is None:
+        return None
+    *fields, fraction = match.groups()
+    return tuple(map(int, fields)) + (int((fraction or "0").ljust(6, "0")),)
 
 
 def utc(t):
@@ -15,6 +44,9 @@ def utc(t):
     elif t == "now":
         t = datetime.utcnow()
     elif isinstance(t, str):
+        fields = parse_iso(t)
+        if fields is not None:
+            return datetime(*fields, tzinfo=UTC)
         t = parse(t)
     elif isinstance(t, tuple):
         t = datetime(*t)
@@ -28,3 +60,79 @@ def utc(t):
         raise ValueError(f"Non-UTC timezones ({t}, {t.tzname()}) are not supported.")
 
     return t
+
+
+def timescale_functions():
+    """skyfield requires a "timescale" object that is used for things like
+    leap seconds. we want to initialize it once, but avoid making it
+    a global variable.
+    This closure exposes the functions that rely on a global timescale,
+    """
+    timescale = Loader(settings.EPHEM_DIR).timescale(builtin=True)
+
+    def now():
+        return timescale.now()
+
+    def add_seconds(t, s):
+        """adds s seconds (a number or a numpy array) to a Time.
+        this is done on the TAI julian date, which doesn't have leap
+        seconds, so stepping over a leap second takes it into account.
+        """
+        return timescale.tai_jd(t.whole, t.tai_fraction + s / DAY_S)
+
+    def tt(t):
+        """do whatever it takes to make time into skyfield"""
+        if t == "now":
+            return now()
+        if isinstance(t, str):
+            fields = parse_iso(t)
+            if fields is None:
+                t = utc(t)
+            else:
+                *fields, microsecond = fields
+                fields[-1] += microsecond / 1e6
+                t = tuple(fields)
+        if isinstance(t, tuple):
+            t = timescale.utc(*t)
+        if isinstance(t, datetime):
+            t = timescale.utc(t)
+        return t
+
+    def tt_iso(t):
+        if isinstance(t, datetime):
+            return utc(t).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        t = tt(t)
+        return t.utc_iso(places=6)
+
+    def tt_midpoint(start_time, end_time):
+        start_time = tt(start_time)
+        end_time = tt(end_time)
+        days = end_time.whole - start_time.whole
+        fraction = (days + start_time.tai_fraction + end_time.tai_fraction) / 2
+        mid_time = timescale.tai_jd(start_time.whole, fraction)
+        return mid_time
+
+    def tai_jd(t, fraction=None):
+        return timescale.tai_jd(t, fraction)
+
+    return add_seconds, now, tt, tt_iso, tt_midpoint, tai_jd
+
+
+add_seconds, now, tt, tt_iso, tt_midpoint, tai_jd = timescale_functions()
+
+
+def tai_seconds(t):
+    """TAI seconds since TAI_EPOCH_JD of a Time (or an array Time)"""
+    return (t.whole - TAI_EPOCH_JD) * DAY_S + t.tai_fraction * DAY_S
+
+
+def seconds_between(start, end):
+    """the seconds from start to end, without losing the precision of either"""
+    days = end.whole - start.whole
+    return (days + (end.tai_fraction - start.tai_fraction)) * DAY_S
+
+
+def from_tai_seconds(seconds):
+    """the Time (or array Time) of TAI seconds since TAI_EPOCH_JD"""
+    days, seconds = divmod(seconds, DAY_S)
+    return tai_jd(TAI_EPOCH_JD + days, seconds / DAY_S)
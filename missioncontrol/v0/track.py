@@ -1,11 +1,142 @@
+import json
+import struct
+import numpy as np
+
+from itertools import islice
+
 from flask import request, Response
 from home.leaf import LeafPassFile
+from v0.time import DAY_S, tai_seconds
 
 DEF_STEP_S = 5
+# points per chunk of a streamed track
+TRACK_CHUNK_POINTS = 256
+
+# packed track format (all little-endian):
+#   header: magic, version, header size, point count, padding,
+#           epoch (TAI seconds since TAI_EPOCH_JD, J2000, of the first point)
+#   float64[count] offsets (TAI seconds since epoch)
+#   float32[count] azimuth (deg)
+#   float32[count] altitude (deg)
+#   float32[count] range (km)
+PACKED_TRACK_MAGIC = b"MCTK"
+PACKED_TRACK_VERSION = 1
+PACKED_TRACK_HEADER = struct.Struct("<4sHHI4xd")
+
+
+def simplify_track(t, altitude, azimuth, tolerance):
+    """Ramer-Douglas-Peucker simplification of an altaz track.
+
+    returns a boolean mask of the points needed to reconstruct both
+    altitude and azimuth (by linear interpolation in time between the kept
+    points) to within `tolerance` degrees.
+    """
+    t = np.asarray(t, dtype=float)
+    altitude = np.asarray(altitude, dtype=float)
+    # interpolate across 0/360 the short way around
+    azimuth = np.degrees(np.unwrap(np.radians(azimuth)))
+
+    keep = np.zeros(len(t), dtype=bool)
+    if not len(t):
+        return keep
+    keep[0] = keep[-1] = True
+
+    segments = [(0, len(t) - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        inner = slice(first + 1, last)
+        frac = (t[inner] - t[first]) / (t[last] - t[first])
+
+        def error(values):
+            lerp = values[first] + frac * (values[last] - values[first])
+            return np.abs(lerp - values[inner])
+
+        err = np.maximum(error(altitude), error(azimuth))
+        worst = int(np.argmax(err))
+        if err[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            segments += [(first, split), (split, last)]
+    return keep
+
+
+def _track_offsets(times):
+    """seconds elapsed since the first time in an array Time"""
+    whole = times.whole - times.whole[0]
+    fraction = times.tai_fraction - times.tai_fraction[0]
+    return (whole + fraction) * DAY_S
+
 
+def columnar_track(times, altitude, azimuth, _range):
+    """a track as one array per column, with times as offsets (in
+    seconds) from the epoch (the first point)
+    """
+    return {
+        "epoch": times[0].utc_iso(places=6),
+        "offsets": _track_offsets(times).tolist(),
+        "azimuth": azimuth.tolist(),
+        "altitude": altitude.tolist(),
+        "range": _range.tolist(),
+    }
 
-def get_track_file(access, step=DEF_STEP_S):
+
+def iter_packed_track(times, altitude, azimuth, _range):
+    """yields a track in the packed binary format described by
+    PACKED_TRACK_HEADER, the header then each column, so clients can decode
+    each column with a single array view
+    """
+    yield PACKED_TRACK_HEADER.pack(
+        PACKED_TRACK_MAGIC,
+        PACKED_TRACK_VERSION,
+        PACKED_TRACK_HEADER.size,
+        len(azimuth),
+        tai_seconds(times[0]),
+    )
+    yield _track_offsets(times).astype("<f8").tobytes()
+    yield azimuth.astype("<f4").tobytes()
+    yield altitude.astype("<f4").tobytes()
+    yield _range.astype("<f4").tobytes()
+
+
+def packed_track(times, altitude, azimuth, _range):
+    """`iter_packed_track` as one bytes"""
+    return b"".join(iter_packed_track(times, altitude, azimuth, _range))
+
+
+def iter_json_track(points, size=TRACK_CHUNK_POINTS):
+    """yields a json array of track points in chunks of `size` points"""
+    points = iter(points)
+    separator = b"["
+    while True:
+        chunk = [json.dumps(point) for point in islice(points, size)]
+        if not chunk:
+            break
+        yield separator + ",".join(chunk).encode()
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
+
+
+def get_track_file(access, step=DEF_STEP_S, tolerance=None):
+    """the track of an access in the format the request accepts.
+    the track is computed in one go, but the formats that can be are
+    streamed as they are encoded, so they can be compressed chunk by chunk
+    (see `compression.CompressionMiddleware`)
+    """
     accepts = request.headers.get("accept", "")
+    if "application/vnd.track+json" in accepts:
+        track = access.track_arrays(step, tolerance)
+        return (
+            columnar_track(*track),
+            200,
+            {"Content-Type": "application/vnd.track+json"},
+        )
+    if "application/vnd.track+binary" in accepts:
+        track = access.track_arrays(step, tolerance)
+        return Response(
+            iter_packed_track(*track), mimetype="application/vnd.track+binary"
+        )
     if "application/vnd.leaf+json" in accepts:
         return (
             LeafPassFile.from_access(access).json,
@@ -14,6 +145,10 @@ def get_track_file(access, step=DEF_STEP_S):
         )
     if "application/vnd.leaf+text" in accepts:
         return Response(
-            str(LeafPassFile.from_access(access)), mimetype="application/octet-stream"
+            LeafPassFile.from_access(access).iter_bytes(),
+            mimetype="application/octet-stream",
         )
-    return list(access.iter_track(step=step))
+    return Response(
+        iter_json_track(access.iter_track(step=step, tolerance=tolerance)),
+        mimetype="application/json",
+    )